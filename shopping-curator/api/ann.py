@@ -0,0 +1,329 @@
+import hashlib
+import os
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # optional dependency, only needed for the "hnsw" backend
+    hnswlib = None
+
+
+def matrix_fingerprint(matrix):
+    """Cheap fingerprint of an embedding matrix, used to reject stale saved indexes."""
+    step = max(1, len(matrix) // 1000)
+    digest = hashlib.sha1(str(matrix.shape).encode("utf-8"))
+    digest.update(np.ascontiguousarray(matrix[::step]).tobytes())
+    return digest.hexdigest()
+
+
+def top_k_rows(scores, k):
+    """Indices of the k largest scores in each row, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    return np.take_along_axis(top, np.argsort(-top_scores, axis=1), axis=1)
+
+
+class ExactBackend:
+    """Brute-force inner product over the whole matrix."""
+
+    name = "exact"
+
+    def __init__(self, **params):
+        self.matrix = None
+
+    def build(self, matrix):
+        self.matrix = matrix
+        return self
+
+    def refresh(self, matrix, updated=(), added=0, keep=None):
+        """Return a backend for an updated matrix (used by incremental index sync).
+
+        `updated` are rows whose vectors changed and `added` the number of
+        rows appended, both before rows are dropped; `keep` masks the rows
+        that survive (None keeps all). See ProductIndex.apply_changes.
+        """
+        return ExactBackend().build(matrix)
+
+    def search(self, queries, k):
+        """Return one array of candidate row ids per query, best first."""
+        top = top_k_rows(queries @ self.matrix.T, k)
+        return list(top)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, backend=self.name)
+
+    def load(self, path, matrix):
+        self.matrix = matrix
+        return self
+
+
+class IVFBackend:
+    """Inverted-file index: k-means coarse quantizer with nprobe lists scanned per query.
+
+    `nlist` trades build time and memory for finer partitions; raising
+    `nprobe` raises recall at the cost of scanning more rows.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, train_size=50000, iterations=10, seed=0, **params):
+        self.nlist = nlist
+        self.nprobe = int(nprobe)
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.matrix = None
+        self.centroids = None
+        self.assignment = None
+        self.list_offsets = None
+        self.list_ids = None
+
+    def build(self, matrix):
+        n = len(matrix)
+        nlist = int(self.nlist or max(1, int(4 * np.sqrt(n))))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(self.seed)
+        sample = matrix[rng.choice(n, size=min(n, self.train_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        # Spherical k-means: vectors are unit length, so assign by inner product
+        for _ in range(self.iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        self.centroids = centroids.astype(np.float32)
+        return self.assign(matrix)
+
+    def assign(self, matrix):
+        """Fill the inverted lists for matrix using the already trained centroids."""
+        self.matrix = matrix
+        assignment = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), 65536):
+            block = matrix[start:start + 65536]
+            assignment[start:start + len(block)] = self.nearest(block)
+        return self.set_assignment(assignment)
+
+    def nearest(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def set_assignment(self, assignment):
+        """Rebuild the inverted lists from a row -> list assignment."""
+        nlist = len(self.centroids)
+        self.assignment = assignment
+        # Radix sort on narrow integers keeps this linear in the row count
+        keys = assignment.astype(np.int16) if nlist <= np.iinfo(np.int16).max else assignment
+        self.list_ids = np.argsort(keys, kind="stable").astype(np.int64)
+        counts = np.bincount(assignment, minlength=nlist)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return self
+
+    def row_assignment(self):
+        """List of every row, recovered from the inverted lists when loaded from disk."""
+        if self.assignment is None:
+            assignment = np.empty(len(self.list_ids), dtype=np.int64)
+            counts = np.diff(self.list_offsets)
+            assignment[self.list_ids] = np.repeat(np.arange(len(counts)), counts)
+            self.assignment = assignment
+        return self.assignment
+
+    def refresh(self, matrix, updated=(), added=0, keep=None):
+        # Catalog edits rarely move the cluster structure, so keep the
+        # centroids and only reassign the rows that changed or were added
+        assignment = self.row_assignment()
+        changed = np.concatenate([
+            np.asarray(list(updated), dtype=np.int64),
+            np.arange(len(assignment), len(assignment) + added, dtype=np.int64),
+        ])
+        assignment = np.concatenate([assignment, np.zeros(added, dtype=np.int64)])
+        if len(changed):
+            # Changed rows always survive; find where they land after the drop
+            new_rows = changed if keep is None else (np.cumsum(keep) - 1)[changed]
+            assignment[changed] = self.nearest(matrix[new_rows])
+        if keep is not None:
+            assignment = assignment[keep]
+
+        backend = IVFBackend(self.nlist, self.nprobe, self.train_size, self.iterations, self.seed)
+        backend.centroids = self.centroids
+        backend.matrix = matrix
+        return backend.set_assignment(assignment)
+
+    def search(self, queries, k):
+        nprobe = max(1, min(self.nprobe, len(self.centroids)))
+        probes = top_k_rows(queries @ self.centroids.T, nprobe)
+
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([
+                self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+            ])
+            if not len(candidates):
+                results.append(candidates)
+                continue
+            scores = self.matrix[candidates] @ query
+            results.append(candidates[top_k_rows(scores[np.newaxis, :], k)[0]])
+        return results
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                backend=self.name,
+                centroids=self.centroids,
+                list_ids=self.list_ids,
+                list_offsets=self.list_offsets,
+            )
+
+    def load(self, path, matrix):
+        data = np.load(path)
+        self.matrix = matrix
+        self.centroids = data["centroids"]
+        self.list_ids = data["list_ids"]
+        self.list_offsets = data["list_offsets"]
+        return self
+
+
+class HNSWBackend:
+    """Graph index via hnswlib. `ef_search` is the recall/latency knob at query time.
+
+    Graph labels are stable ids rather than row numbers, so incremental
+    sync adds changed vectors under new labels and marks the old ones
+    deleted instead of rebuilding. Each backend generation maps labels to
+    its own rows and ignores labels it doesn't know. The graph is rebuilt
+    only when it runs out of room.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, m=16, ef_construction=200, ef_search=64, threads=-1, **params):
+        if hnswlib is None:
+            raise ImportError("The 'hnsw' ANN backend requires the hnswlib package")
+        self.m = int(m)
+        self.ef_construction = int(ef_construction)
+        self.ef_search = int(ef_search)
+        self.threads = int(threads)
+        self.index = None
+        self.row_labels = None
+        self.label_rows = None
+
+    def _new_index(self, matrix):
+        return hnswlib.Index(space="ip", dim=matrix.shape[1])
+
+    def _copy(self):
+        return HNSWBackend(self.m, self.ef_construction, self.ef_search, self.threads)
+
+    def set_labels(self, row_labels, next_label):
+        """Row -> label array and the reverse lookup (-1 for labels not in this generation)."""
+        self.row_labels = row_labels
+        self.label_rows = np.full(next_label, -1, dtype=np.int64)
+        self.label_rows[row_labels] = np.arange(len(row_labels))
+        return self
+
+    def build(self, matrix):
+        self.index = self._new_index(matrix)
+        # Headroom for rows added by sync before the graph must be rebuilt
+        self.index.init_index(max_elements=max(2 * len(matrix), 1), ef_construction=self.ef_construction, M=self.m)
+        self.index.add_items(matrix, np.arange(len(matrix)), num_threads=self.threads)
+        self.index.set_ef(self.ef_search)
+        return self.set_labels(np.arange(len(matrix), dtype=np.int64), len(matrix))
+
+    def refresh(self, matrix, updated=(), added=0, keep=None):
+        old_rows = len(self.row_labels)
+        updated = np.asarray(list(updated), dtype=np.int64)
+        changed = np.concatenate([updated, np.arange(old_rows, old_rows + added, dtype=np.int64)])
+        removed = np.flatnonzero(~keep[:old_rows]) if keep is not None else np.zeros(0, dtype=np.int64)
+        if self.index.get_current_count() + len(changed) > self.index.get_max_elements():
+            return self._copy().build(matrix)
+
+        next_label = len(self.label_rows)
+        new_labels = np.arange(next_label, next_label + len(changed), dtype=np.int64)
+        if len(changed):
+            new_rows = changed if keep is None else (np.cumsum(keep) - 1)[changed]
+            self.index.add_items(matrix[new_rows], new_labels, num_threads=self.threads)
+        # Add before deleting so searches in flight always find a version of each row
+        for label in self.row_labels[np.concatenate([updated, removed])]:
+            self.index.mark_deleted(int(label))
+
+        row_labels = np.concatenate([self.row_labels, np.zeros(added, dtype=np.int64)])
+        row_labels[changed] = new_labels
+        if keep is not None:
+            row_labels = row_labels[keep]
+        backend = self._copy()
+        backend.index = self.index
+        return backend.set_labels(row_labels, next_label + len(changed))
+
+    def search(self, queries, k):
+        k = min(k, len(self.row_labels))
+        if k <= 0:
+            return [np.zeros(0, dtype=np.int64) for _ in range(len(queries))]
+        # hnswlib requires ef >= k
+        self.index.set_ef(max(self.ef_search, k))
+        labels, _ = self.index.knn_query(queries, k=k, num_threads=self.threads)
+        labels = labels.astype(np.int64)
+        rows = np.where(labels < len(self.label_rows), self.label_rows[np.minimum(labels, len(self.label_rows) - 1)], -1)
+        return [row[row >= 0] for row in rows]
+
+    def save(self, path):
+        self.index.save_index(path)
+        with open(f"{path}.labels.npz", "wb") as f:
+            np.savez(f, row_labels=self.row_labels, next_label=len(self.label_rows))
+
+    def load(self, path, matrix):
+        self.index = self._new_index(matrix)
+        self.index.load_index(path, max_elements=max(2 * len(matrix), 1))
+        self.index.set_ef(self.ef_search)
+        labels_path = f"{path}.labels.npz"
+        if not os.path.exists(labels_path):
+            # Indexes saved before labels were stored used row numbers
+            return self.set_labels(np.arange(len(matrix), dtype=np.int64), len(matrix))
+        labels = np.load(labels_path)
+        return self.set_labels(labels["row_labels"], int(labels["next_label"]))
+
+
+ANN_BACKENDS = {
+    backend.name: backend for backend in (ExactBackend, IVFBackend, HNSWBackend)
+}
+
+
+def get_backend(name, **params):
+    try:
+        backend_cls = ANN_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown ANN backend '{name}', expected one of {sorted(ANN_BACKENDS)}")
+    return backend_cls(**params)
+
+
+def backend_params_from_env():
+    """ANN tuning knobs from the environment (ANN_NLIST, ANN_NPROBE, ANN_M, ...)."""
+    params = {}
+    for key in ("nlist", "nprobe", "m", "ef_construction", "ef_search"):
+        value = os.getenv(f"ANN_{key.upper()}")
+        if value:
+            params[key] = int(value)
+    return params
+
+
+def save_backend(backend, path, matrix):
+    """Save a built backend next to a small header identifying the catalog it indexes."""
+    backend.save(path)
+    np.savez(f"{path}.meta.npz", backend=backend.name, fingerprint=matrix_fingerprint(matrix))
+
+
+def load_backend(path, matrix, **params):
+    """Load a saved backend, or return None if it is missing or built for another catalog."""
+    meta_path = f"{path}.meta.npz"
+    if not os.path.exists(meta_path):
+        return None
+    meta = np.load(meta_path)
+    if str(meta["fingerprint"]) != matrix_fingerprint(matrix):
+        print(f"Ignoring stale ANN index at {path}")
+        return None
+    return get_backend(str(meta["backend"]), **params).load(path, matrix)
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+import time
+from django.views.decorators.csrf import csrf_exempt
+from .embedding_cache import normalize_term
+from .filters import ProductFilters
+from .responses import FastJsonResponse, ProductTable, compact_recipe_items, compact_shopping_items, wants_compact
+from .recipe_scaling import CANONICAL_SERVINGS, scale_ingredients
+from .views import (
+    categorize_ingredients, fetch_recipe_ingredients, recommend_terms,
+    group_recipe_items, load_product_index, recipe_items, run_cpu_bound, shopping_result,
+    stream_shopping_items,
+)
+
+MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", 1000))
+# Concurrent Gemini calls while expanding a batch
+LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 8))
+MAX_TOP_K = 50
+
+
+def parse_job(position, job):
+    """Validate one job and fill in defaults; raises ValueError on bad input."""
+    if not isinstance(job, dict):
+        raise ValueError(f"Job {position} must be an object")
+    mode = job.get("mode", "shopping")
+    parsed = {"id": job.get("id", position), "mode": mode}
+    if mode == "recipe":
+        parsed["recipe_name"] = str(job.get("recipe_name", "")).strip()
+        parsed["servings"] = max(1, int(job.get("servings", 4)))
+        if not parsed["recipe_name"]:
+            raise ValueError(f"Job {position}: recipe name is required")
+    elif mode == "shopping":
+        parsed["items"] = str(job.get("items", ""))
+    else:
+        raise ValueError(f"Job {position}: unknown mode '{mode}'")
+    return parsed
+
+
+def job_key(job):
+    """Jobs with the same key share one expansion (recipes are scaled per job)."""
+    if job["mode"] == "recipe":
+        return "recipe", normalize_term(job["recipe_name"])
+    return "shopping", normalize_term(job["items"])
+
+
+async def expand_job(job):
+    """Return ("recipe", ingredients at canonical size), ("shopping", item names) or ("error", message)."""
+    items_text = job.get("items", "")
+    if job["mode"] == "recipe":
+        try:
+            return "recipe", await fetch_recipe_ingredients(job["recipe_name"], CANONICAL_SERVINGS)
+        except Exception as e:
+            # Same fallback as process_recipe_mode
+            print(f"Error processing recipe: {e}")
+            items_text = job["recipe_name"]
+    if not items_text.strip():
+        return "shopping", []
+    try:
+        return "shopping", [item async for item in stream_shopping_items(items_text)]
+    except Exception as e:
+        return "error", f"Processing failed: {str(e)}"
+
+
+async def expand_unique(jobs):
+    """Expand each distinct input once, at most LLM_CONCURRENCY at a time."""
+    unique = {}
+    for job in jobs:
+        unique.setdefault(job_key(job), job)
+
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def expand(job):
+        async with semaphore:
+            return await expand_job(job)
+
+    expanded = await asyncio.gather(*(expand(job) for job in unique.values()))
+    return dict(zip(unique, expanded))
+
+
+def score_terms(expanded, product_index, top_k, filters=None):
+    """Score every distinct term in the batch in one pass.
+
+    Terms in the precomputed term table are looked up, the rest are encoded
+    once. Returns term -> recommendations and ingredient name -> category.
+    """
+    terms = []
+    recipe_terms = []
+    for kind, payload in expanded.values():
+        if kind == "shopping":
+            terms.extend(payload)
+        elif kind == "recipe":
+            recipe_terms.extend(ingredient["search_term"] for ingredient in payload)
+    recipe_terms = list(dict.fromkeys(recipe_terms))
+    terms = list(dict.fromkeys(terms + recipe_terms))
+    if not terms:
+        return {}, {}
+
+    all_recommendations, embeddings = recommend_terms(terms, product_index, top_k, filters=filters)
+    recommendations = dict(zip(terms, all_recommendations))
+    # Categorization reuses the retrieval vectors; only table hits get encoded
+    vectors = dict(zip(terms, embeddings))
+    recipe_embeddings = [vectors[term] for term in recipe_terms]
+    categories = dict(zip(recipe_terms, categorize_ingredients(recipe_terms, recipe_embeddings) if recipe_terms else []))
+    return recommendations, categories
+
+
+async def score_expansions(expanded, product_index, top_k, filters=None):
+    """Score the batch in one pass; if that fails, score each input alone.
+
+    Returns the expansions, with those that failed replaced by an error,
+    plus the merged recommendations and categories, so one bad input only
+    fails the jobs that share it.
+    """
+    try:
+        recommendations, categories = await run_cpu_bound(score_terms, expanded, product_index, top_k, filters)
+        return expanded, recommendations, categories
+    except Exception as e:
+        print(f"Error scoring batch, retrying per input: {e}")
+
+    expanded = dict(expanded)
+    recommendations = {}
+    categories = {}
+    for key, expansion in expanded.items():
+        try:
+            scored = await run_cpu_bound(score_terms, {key: expansion}, product_index, top_k, filters)
+        except Exception as e:
+            expanded[key] = ("error", f"Processing failed: {str(e)}")
+            continue
+        recommendations.update(scored[0])
+        categories.update(scored[1])
+    return expanded, recommendations, categories
+
+
+def job_result(job, expansion, recommendations, categories, table=None):
+    kind, payload = expansion
+    if kind == "error":
+        return {"id": job["id"], "error": payload}
+    if kind == "shopping":
+        items = shopping_result(payload, [recommendations[item] for item in payload])
+        return {
+            "id": job["id"],
+            "mode": "shopping",
+            "items": compact_shopping_items(items, table) if table is not None else items
+        }
+
+    ingredients = scale_ingredients(payload, CANONICAL_SERVINGS, job["servings"])
+    terms = [ingredient["search_term"] for ingredient in ingredients]
+    items = recipe_items(
+        ingredients, [recommendations[term] for term in terms], [categories[term] for term in terms]
+    )
+    return {
+        "id": job["id"],
+        "mode": "recipe",
+        "recipe_info": {"name": job["recipe_name"], "servings": job["servings"]},
+        "items": compact_recipe_items(items, table) if table is not None else group_recipe_items(items)
+    }
+
+
+@csrf_exempt
+async def process_batch(request):
+    """Process many shopping lists and recipes in one request.
+
+    Identical inputs are expanded once, and every distinct search term in
+    the batch is encoded and scored together before results are fanned
+    back out per job.
+    """
+    if request.method != "POST":
+        return FastJsonResponse({"error": "POST method required"}, status=405)
+
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return FastJsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    try:
+        raw_jobs = data.get("jobs")
+        if not isinstance(raw_jobs, list) or not raw_jobs:
+            raise ValueError("'jobs' must be a non-empty list")
+        if len(raw_jobs) > MAX_JOBS:
+            raise ValueError(f"At most {MAX_JOBS} jobs per batch")
+        jobs = [parse_job(position, job) for position, job in enumerate(raw_jobs)]
+        top_k = min(MAX_TOP_K, max(1, int(data.get("top_k", 5))))
+        filters = ProductFilters.from_request(data.get("filters"))
+    except (ValueError, TypeError, AttributeError) as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+
+    started = time.perf_counter()
+    product_index_task = asyncio.create_task(asyncio.to_thread(load_product_index))
+    expanded = await expand_unique(jobs)
+
+    try:
+        product_index = await product_index_task
+        if not len(product_index):
+            return FastJsonResponse({"error": "No products found in database"}, status=500)
+    except Exception as e:
+        return FastJsonResponse({"error": f"Database error: {str(e)}"}, status=500)
+
+    expanded, recommendations, categories = await score_expansions(expanded, product_index, top_k, filters)
+    # One product table for the whole batch in the compact format
+    table = ProductTable() if wants_compact(data.get("response_format")) else None
+    results = [job_result(job, expanded[job_key(job)], recommendations, categories, table) for job in jobs]
+
+    body = {
+        "results": results,
+        "stats": {
+            "jobs": len(jobs),
+            "unique_inputs": len(expanded),
+            "unique_terms": len(recommendations),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+    }
+    if table is not None:
+        body["products"] = table.products
+    return FastJsonResponse(body, status=200)
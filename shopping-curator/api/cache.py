@@ -0,0 +1,180 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-memory cache with a size limit and hit/miss counters."""
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """Key/value cache in a local SQLite file, shared by every worker on a host.
+
+    Entries expire after `ttl` seconds (if set) and the least recently used
+    rows are evicted once the table grows past `max_entries`.
+    """
+
+    def __init__(self, path, table="cache", max_entries=100000, ttl=None):
+        self.path = str(path)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connection()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB, created_at REAL, accessed_at REAL)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Return a dict of the keys that are present and not expired."""
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        conn = self._connection()
+        now = time.time()
+        found = {}
+        expired = []
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for key, value, created_at in rows:
+                if self._expired(created_at, now):
+                    expired.append(key)
+                else:
+                    found[key] = value
+
+        if found or expired:
+            conn.executemany(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in expired])
+            conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        if not items:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            [(key, value, now, now) for key, value in items.items()],
+        )
+        conn.commit()
+
+        self._writes += len(items)
+        if self._writes >= max(1, self.max_entries // 100):
+            self._writes = 0
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows and trim the table to max_entries by last access."""
+        conn = self._connection()
+        if self.ttl is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+
+    def __len__(self):
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -1,12 +1,21 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
+import hashlib
 import os
 from dotenv import load_dotenv
+from .llm_cache import CachedRunnable, get_model_name
 
 load_dotenv()
 
-def get_chain(llm) -> Runnable:
+def with_cache(chain, prompt, llm, cache, name) -> Runnable:
+    """Wrap a chain in a response cache scoped to its prompt text and model."""
+    if cache is None:
+        return chain
+    prompt_hash = hashlib.sha256(prompt.pretty_repr().encode("utf-8")).hexdigest()[:12]
+    return CachedRunnable(chain, cache, f"{name}:{prompt_hash}", get_model_name(llm))
+
+def get_chain(llm, cache=None) -> Runnable:
     
     # Fixed template with proper variable names and better structure
     prompt = ChatPromptTemplate.from_template(
@@ -47,9 +56,9 @@ def get_chain(llm) -> Runnable:
     # Create a runnable that formats inputs and passes them to the chain
     chain = prompt | llm | StrOutputParser()
 
-    return chain
+    return with_cache(chain, prompt, llm, cache, "shopping")
 
-def get_chain_recipe(llm) -> Runnable:
+def get_chain_recipe(llm, cache=None) -> Runnable:
 
     prompt = ChatPromptTemplate.from_template(
         '''You are a professional recipe ingredient specialist. Your task is to analyze a recipe name and serving size, then return a structured list of ingredients with quantities that can be purchased from supermarkets like Walmart.
@@ -81,5 +90,4 @@ def get_chain_recipe(llm) -> Runnable:
 
     chain = prompt | llm | StrOutputParser()
 
-    return chain
-
+    return with_cache(chain, prompt, llm, cache, "recipe")
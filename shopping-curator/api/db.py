@@ -0,0 +1,29 @@
+import os
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    return _client
+
+
+def get_database():
+    return get_client()["shopping"]
+
+
+def get_products_collection():
+    return get_database()["products"]
+
+
+def reset_client():
+    """Forget the client so a forked worker opens its own connections."""
+    global _client
+    _client = None
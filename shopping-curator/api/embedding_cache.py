@@ -0,0 +1,66 @@
+import numpy as np
+from .cache import LRUCache, SQLiteCache
+from .encoders import encoder_identity
+
+
+def normalize_term(term):
+    """Cache key for a search term: lowercase with collapsed whitespace."""
+    return " ".join(str(term).lower().split())
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings in front of a sentence encoder.
+
+    Lookups go to the in-process LRU first, then to the optional shared
+    SQLite file, and only the remaining misses are encoded (in one batch).
+    Shared keys are prefixed with the encoder's identity (backend, model
+    and dimension), since the file outlives any one encoder configuration.
+    """
+
+    def __init__(self, encoder, max_size=10000, shared_path=None):
+        self.encoder = encoder
+        self.memory = LRUCache(max_size)
+        self.shared = SQLiteCache(shared_path, table="embeddings") if shared_path else None
+        self.namespace = encoder_identity(encoder) if shared_path else ""
+
+    def shared_key(self, key):
+        return f"{self.namespace}|{key}"
+
+    def encode(self, terms):
+        """Return a float32 matrix with one embedding row per term."""
+        keys = [normalize_term(term) for term in terms]
+        vectors = {}
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and self.shared is not None:
+            found = self.shared.get_many([self.shared_key(key) for key in missing])
+            for key in missing:
+                blob = found.get(self.shared_key(key))
+                if blob is None:
+                    continue
+                vector = np.frombuffer(blob, dtype=np.float32)
+                vectors[key] = vector
+                self.memory.set(key, vector)
+            missing = [key for key in missing if key not in vectors]
+
+        if missing:
+            encoded = np.asarray(self.encoder.encode(missing), dtype=np.float32)
+            for key, vector in zip(missing, encoded):
+                vectors[key] = vector
+                self.memory.set(key, vector)
+            if self.shared is not None:
+                self.shared.set_many({self.shared_key(key): vectors[key].tobytes() for key in missing})
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def stats(self):
+        stats = self.memory.stats()
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+ONNX_FILES = ("model_int8.onnx", "model.onnx")
+
+
+class OnnxEncoder:
+    """all-MiniLM-L6-v2 exported to ONNX (int8 quantized by default) and run on onnxruntime.
+
+    Exposes the same `encode` call as SentenceTransformer: mean pooling over
+    the attention mask followed by L2 normalization, float32 output.
+    """
+
+    def __init__(self, model_dir, threads=None, max_length=256, quantized=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = int(threads)
+
+        filenames = ONNX_FILES if quantized else ONNX_FILES[1:]
+        path = next((os.path.join(model_dir, name) for name in filenames
+                     if os.path.exists(os.path.join(model_dir, name))), None)
+        if path is None:
+            raise FileNotFoundError(f"No ONNX encoder found in {model_dir}; run 'manage.py export_onnx_encoder'")
+
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.dimension = int(self._encode_batch(["dimension"]).shape[1])
+
+    @property
+    def identity(self):
+        return f"onnx:{MODEL_NAME}:{os.path.basename(self.path)}:{self.dimension}"
+
+    def encode(self, sentences, batch_size=64, **kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            batches.append(self._encode_batch(sentences[start:start + batch_size]))
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(
+            None, {name: value for name, value in inputs.items() if name in self.input_names}
+        )[0]
+
+        mask = inputs["attention_mask"][:, :, np.newaxis].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def load_sentence_transformer(threads=None):
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        import torch
+        torch.set_num_threads(int(threads))
+    model = SentenceTransformer(MODEL_NAME)
+    model.identity = f"sentence-transformers:{MODEL_NAME}:{model.get_sentence_embedding_dimension()}"
+    return model
+
+
+def encoder_identity(encoder):
+    """Backend, model and output dimension of an encoder, e.g. 'onnx:all-MiniLM-L6-v2:model_int8.onnx:384'.
+
+    Persistent embedding caches are keyed by it, so switching the backend or
+    model never serves vectors computed by another one.
+    """
+    identity = getattr(encoder, "identity", None)
+    if identity:
+        return identity
+    dimension = np.asarray(encoder.encode(["dimension"])).shape[-1]
+    return f"{type(encoder).__name__}:{dimension}"
+
+
+def load_encoder_from_env():
+    """Build the query encoder selected by ENCODER_BACKEND (sentence-transformers or onnx)."""
+    backend = os.getenv("ENCODER_BACKEND", "sentence-transformers")
+    threads = os.getenv("ENCODER_THREADS")
+    if backend == "onnx":
+        return OnnxEncoder(
+            os.getenv("ENCODER_ONNX_DIR", "onnx-encoder"),
+            threads=threads,
+            quantized=os.getenv("ENCODER_ONNX_QUANTIZED", "1") != "0"
+        )
+    if backend == "sentence-transformers":
+        return load_sentence_transformer(threads)
+    raise ValueError(f"Unknown ENCODER_BACKEND '{backend}', expected 'sentence-transformers' or 'onnx'")
@@ -0,0 +1,156 @@
+import re
+import threading
+
+# Requests with fewer items than this still go to the LLM, since a single
+# word may be a compound product it should break down ("bicycle", "lasagna")
+MIN_ITEMS = 2
+# Longer segments read as descriptions rather than product names
+MAX_ITEM_WORDS = 4
+
+# Words that mark a request as descriptive ("items for a birthday cake")
+DESCRIPTIVE_WORDS = {
+    "for", "to", "make", "making", "need", "needed", "needs", "want", "ingredients",
+    "items", "things", "stuff", "supplies", "everything", "recipe", "how", "what",
+    "i", "my", "we", "our", "please", "some", "like", "something", "party", "meal",
+}
+
+# Receipt lines that are not products
+RECEIPT_NOISE = re.compile(
+    r"^(sub\s*total|total|tax|vat|change|cash|credit|debit|visa|mastercard|amex|card|"
+    r"balance|amount|payment|tender|savings|discount|coupon|receipt|store|cashier|"
+    r"thank|tel|phone|date|time|items?|qty|quantity|price|description)\b"
+)
+BULLET = re.compile(r"^\s*(?:[-*+•·▪◦>]+|\d+[.)]|\[[ xX]?\])\s*")
+PRICE = re.compile(r"[$€£₹]\s*\d+(?:[.,]\d{1,2})?|\b\d+[.,]\d{2}\b(?:\s*[A-Z]\b)?")
+# Amounts like "2", "1/2", "1 1/2", "1.5", "2-3" and "½"
+NUMBER = r"(?:\d+(?:[./]\d+)?(?:\s+\d+/\d+)?(?:\s*-\s*\d+(?:[./]\d+)?)?|[½¼¾⅓⅔⅛])"
+UNIT = (
+    r"(?:lbs?|pounds?|oz|ounces?|fl\.?\s*oz|g|grams?|kgs?|kilos?|kilograms?|mg|ml|l|liters?|litres?|"
+    r"gal|gallons?|qts?|quarts?|pts?|pints?|cups?|c|tbsps?|tbs|tablespoons?|tsps?|teaspoons?|"
+    r"cans?|jars?|bottles?|boxe?s|box|bags?|packs?|packages?|pkgs?|ct|count|dozen|doz|"
+    r"bunch(?:es)?|heads?|cloves?|slices?|pieces?|pcs?|ea|each|sticks?|loaf|loaves|cartons?)"
+)
+# An amount with its unit: "2 lbs", "500g", "1 cup of"
+MEASURE = rf"{NUMBER}\s*{UNIT}\b\.?(?:\s+of\b)?"
+QUANTITY = re.compile(
+    rf"^\s*(?:{NUMBER}\s*[xX×]\s*|qty\.?\s*\d+\s*|{MEASURE}\s*|{NUMBER}\s+(?=[a-zA-Z]))+"
+    rf"|\s*(?:[xX×]\s*\d+|@\s*\d+|{MEASURE})\s*$",
+    re.IGNORECASE,
+)
+# Receipt headers: the store's name rather than a product
+STORE_NAMES = re.compile(
+    r"\b(walmart|wal-mart|supercenter|target|costco|kroger|safeway|albertsons|publix|aldi|lidl|"
+    r"whole foods|trader joe'?s|wegmans|h-e-b|heb|meijer|food lion|giant eagle|stop & shop|"
+    r"walgreens|cvs|rite aid|sam'?s club|tesco|sainsbury'?s|asda|carrefour)\b",
+    re.IGNORECASE,
+)
+TABLE_RULE = re.compile(r"^[\s|:-]+$")
+WORD = re.compile(r"[a-z][a-z'&%-]*")
+
+
+def clean_segment(segment):
+    """Strip bullets, prices, quantities with their units and markdown from one list entry."""
+    segment = segment.strip().strip("#").strip()
+    segment = BULLET.sub("", segment)
+    segment = PRICE.sub(" ", segment)
+    segment = QUANTITY.sub(" ", segment)
+    segment = re.sub(r"[*_`]+", "", segment)
+    segment = re.sub(r"\s+", " ", segment).strip(" .:;-").lower()
+    return segment
+
+
+def split_segments(text):
+    """Split on newlines, commas, semicolons and markdown table cells."""
+    segments = []
+    for line in text.splitlines():
+        if TABLE_RULE.match(line) and line.strip():
+            continue
+        for cell in line.split("|"):
+            segments.extend(re.split(r"[,;]", cell))
+    return segments
+
+
+def is_header(line, receipt=False):
+    """True for an unpriced receipt header line rather than a product.
+
+    That is a store name printed in caps or on its own ("WALMART
+    SUPERCENTER", "Safeway") and, on a `receipt` with prices, any other
+    all-caps line without a price (store number, address).
+    """
+    if PRICE.search(line):
+        return False
+    letters = re.sub(r"[^A-Za-z]", "", line)
+    caps = len(letters) > 1 and letters.isupper()
+    store = STORE_NAMES.search(line)
+    if store and (caps or clean_segment(line) == store.group(0).lower()):
+        return True
+    return receipt and caps
+
+
+def parse_plain_list(text, is_basic=None):
+    """Return the items of a plain shopping list, or None if the LLM is needed.
+
+    Accepts comma, newline and bullet separated lists as well as OCR'd
+    receipts, whose prices, quantities and totals are stripped. Anything
+    descriptive, sentence-like or too short to be sure of is left to the LLM.
+    Receipt header lines are dropped like totals; only a line holding a
+    single entry can be one, so "MILK, EGGS, BREAD" stays a list. With
+    `is_basic`, every single-word item must pass it, since an unknown word
+    may be a compound product the LLM should break down ("bicycle").
+    """
+    if not text or not text.strip():
+        return None
+    if "?" in text:
+        return None
+    if not re.search(r"[\n,;|]|^\s*(?:[-*+•]|\d+[.)])", text):
+        return None
+
+    receipt = bool(PRICE.search(text))
+    items = []
+    for line in text.splitlines():
+        segments = split_segments(line)
+        if len(segments) == 1 and is_header(line, receipt):
+            continue
+        for segment in segments:
+            item = clean_segment(segment)
+            if not item or RECEIPT_NOISE.match(item) or not WORD.search(item):
+                continue
+            words = item.split()
+            if len(words) > MAX_ITEM_WORDS or DESCRIPTIVE_WORDS.intersection(words):
+                return None
+            if len(words) == 1 and is_basic is not None and not is_basic(item):
+                return None
+            items.append(item)
+
+    items = list(dict.fromkeys(items))
+    if len(items) < MIN_ITEMS:
+        return None
+    return items
+
+
+class FastPathCounter:
+    """Counts shopping requests answered locally versus sent to the LLM."""
+
+    def __init__(self):
+        self.skipped = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def record(self, skipped):
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.escalated += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.skipped + self.escalated
+            return {
+                "skipped_llm": self.skipped,
+                "used_llm": self.escalated,
+                "skip_rate": self.skipped / total if total else 0.0,
+            }
+
+
+fast_path_counter = FastPathCounter()
@@ -0,0 +1,157 @@
+import math
+import re
+import numpy as np
+
+PRICE_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_price(value):
+    """Parse a display price like '$11.13' or '1,299.00' into a float (NaN if absent)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = PRICE_RE.search(str(value or "").replace(",", ""))
+    return float(match.group()) if match else math.nan
+
+
+def as_list(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if str(v).strip()]
+    return [str(value)]
+
+
+class ProductFilters:
+    """Category, brand and price-range constraints for a search."""
+
+    def __init__(self, categories=(), brands=(), min_price=None, max_price=None):
+        self.categories = [c.strip().lower() for c in categories]
+        self.brands = [b.strip().lower() for b in brands]
+        self.min_price = min_price
+        self.max_price = max_price
+
+    @classmethod
+    def from_request(cls, data):
+        """Build filters from a request's 'filters' object, or None if there are none.
+
+        Accepts {"category": "Dairy" | [...], "brand": ..., "min_price": 1, "max_price": 5};
+        raises ValueError on malformed values.
+        """
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("'filters' must be an object")
+
+        def price(key):
+            value = data.get(key)
+            if value in (None, ""):
+                return None
+            value = parse_price(value)
+            if math.isnan(value):
+                raise ValueError(f"'{key}' must be a number")
+            return value
+
+        filters = cls(
+            as_list(data.get("category", data.get("categories"))),
+            as_list(data.get("brand", data.get("brands"))),
+            price("min_price"),
+            price("max_price")
+        )
+        return None if filters.is_empty() else filters
+
+    def is_empty(self):
+        return not (self.categories or self.brands or self.min_price is not None or self.max_price is not None)
+
+
+class ProductColumns:
+    """Columnar copy of the filterable product fields.
+
+    Prices are parsed once into float32, categories and brands are stored
+    as int32 codes, and rows are kept sorted by price so a price range is
+    two binary searches rather than a scan.
+    """
+
+    def __init__(self, prices, category_codes, brand_codes, categories, brands):
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.category_codes = np.asarray(category_codes, dtype=np.int32)
+        self.brand_codes = np.asarray(brand_codes, dtype=np.int32)
+        self.categories = list(categories)
+        self.brands = list(brands)
+        self.category_lookup = {name: code for code, name in enumerate(self.categories)}
+        self.brand_lookup = {name: code for code, name in enumerate(self.brands)}
+        # NaN prices sort last and never fall inside a range
+        self.price_order = np.argsort(self.prices, kind="stable")
+        self.sorted_prices = self.prices[self.price_order]
+        self.category_rows = posting_lists(self.category_codes, len(self.categories))
+        self.brand_rows = posting_lists(self.brand_codes, len(self.brands))
+
+    @classmethod
+    def from_products(cls, products):
+        prices = []
+        category_codes = []
+        brand_codes = []
+        categories = {}
+        brands = {}
+        for product in products:
+            prices.append(parse_price(product.get("price")))
+            category = str(product.get("category", "")).strip().lower()
+            brand = str(product.get("brand", "")).strip().lower()
+            category_codes.append(categories.setdefault(category, len(categories)))
+            brand_codes.append(brands.setdefault(brand, len(brands)))
+        return cls(prices, category_codes, brand_codes, categories, brands)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                prices=self.prices,
+                category_codes=self.category_codes,
+                brand_codes=self.brand_codes,
+                categories=np.array(self.categories, dtype=str),
+                brands=np.array(self.brands, dtype=str),
+            )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(
+            data["prices"], data["category_codes"], data["brand_codes"],
+            data["categories"].tolist(), data["brands"].tolist()
+        )
+
+    def rows(self, filters):
+        """Ascending row ids matching filters.
+
+        Each constraint reads only the rows it selects (a price slice or
+        the posting lists of the wanted codes), and the sets are intersected.
+        """
+        selections = []
+        if filters.min_price is not None or filters.max_price is not None:
+            low = 0 if filters.min_price is None else np.searchsorted(self.sorted_prices, filters.min_price, "left")
+            high = (np.searchsorted(self.sorted_prices, np.inf, "right") if filters.max_price is None
+                    else np.searchsorted(self.sorted_prices, filters.max_price, "right"))
+            selections.append(np.sort(self.price_order[low:max(low, high)]))
+
+        for wanted, lookup, (order, offsets) in (
+            (filters.categories, self.category_lookup, self.category_rows),
+            (filters.brands, self.brand_lookup, self.brand_rows),
+        ):
+            if wanted:
+                codes = {lookup[name] for name in wanted if name in lookup}
+                lists = [order[offsets[code]:offsets[code + 1]] for code in codes]
+                selections.append(np.sort(np.concatenate(lists)) if lists else np.zeros(0, dtype=np.int64))
+
+        if not selections:
+            return np.arange(len(self.prices))
+        rows = min(selections, key=len)
+        for selection in selections:
+            if selection is not rows:
+                rows = np.intersect1d(rows, selection, assume_unique=True)
+        return rows
+
+
+def posting_lists(codes, count):
+    """Rows grouped by code: (rows ordered by code, offsets into them per code)."""
+    order = np.argsort(codes, kind="stable").astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=count))]).astype(np.int64)
+    return order, offsets
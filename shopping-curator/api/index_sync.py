@@ -0,0 +1,141 @@
+import datetime
+import threading
+import time
+from pymongo.errors import PyMongoError
+from .product_index import (
+    VERSION_FIELD, current_product_index, document_projection, swap_product_index,
+)
+
+
+class IndexSyncer:
+    """Keeps the resident product index in step with the products collection.
+
+    Uses a change stream when the deployment supports one (replica sets and
+    Atlas) and otherwise polls for documents whose `updated_at` is past the
+    index watermark. Deletions are picked up from the change stream, or in
+    polling mode by comparing the id set every `id_scan_every` polls. When
+    the stream opens, one full poll catches up on writes made since the
+    index was built. Changes are applied copy-on-write and swapped in
+    atomically.
+    """
+
+    def __init__(self, collection, interval=30, use_change_streams=True, id_scan_every=10, overlap=5.0):
+        self.collection = collection
+        self.interval = interval
+        self.use_change_streams = use_change_streams
+        self.id_scan_every = id_scan_every
+        # Re-read this many seconds before the watermark to catch writes that
+        # committed late with an earlier timestamp; unchanged rows are skipped
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.polls = 0
+        self.applied = 0
+        self._stream = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._stream is not None:
+            self._stream.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Index sync failed: {e}")
+
+    def sync_once(self):
+        """Apply pending catalog changes; returns the number of changed products."""
+        index = current_product_index()
+        if index is None:
+            return 0
+
+        changes = self._changes_from_stream(index)
+        if changes is None:
+            changes = self._changes_from_polling(index)
+        upserts, deleted_ids = changes
+
+        upserts = [doc for doc in upserts if not self._unchanged(index, doc)]
+        deleted_ids = [product_id for product_id in deleted_ids if str(product_id) in index.positions]
+        if not upserts and not deleted_ids:
+            return 0
+
+        # Another thread may have swapped in a newer index meanwhile; apply to the latest
+        swap_product_index(current_product_index().apply_changes(upserts, deleted_ids))
+        self.applied += len(upserts) + len(deleted_ids)
+        print(f"Index sync applied {len(upserts)} upserts and {len(deleted_ids)} deletes")
+        return len(upserts) + len(deleted_ids)
+
+    def _unchanged(self, index, doc):
+        row = index.positions.get(str(doc["_id"]))
+        return row is not None and doc.get(VERSION_FIELD) is not None and index.versions[row] == doc.get(VERSION_FIELD)
+
+    def _changes_from_stream(self, index):
+        if not self.use_change_streams or not hasattr(self.collection, "watch"):
+            return None
+        upserts, deleted_ids = [], []
+        if self._stream is None:
+            try:
+                self._stream = self.collection.watch(full_document="updateLookup")
+            except Exception as e:
+                # Standalone mongod has no change streams (and mocks raise their
+                # own errors); fall back to polling for good
+                print(f"Change streams unavailable ({e}), polling instead")
+                self.use_change_streams = False
+                return None
+            # Writes made between the index build and the stream opening are
+            # not in the stream; catch up on them with one full poll
+            upserts, deleted_ids = self._changes_from_polling(index, scan_ids=True)
+        try:
+            while True:
+                change = self._stream.try_next()
+                if change is None:
+                    break
+                operation = change["operationType"]
+                if operation == "delete":
+                    deleted_ids.append(change["documentKey"]["_id"])
+                elif operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                    upserts.append(change["fullDocument"])
+            return upserts, deleted_ids
+        except PyMongoError as e:
+            # The stream broke (e.g. its resume point expired); poll this time
+            # and reopen it, with another catch-up poll, on the next sync
+            print(f"Change stream failed ({e}), reopening")
+            self._stream.close()
+            self._stream = None
+            return None
+
+    def _changes_from_polling(self, index, scan_ids=False):
+        self.polls += 1
+        watermark = index.watermark
+        if watermark is None:
+            query = {VERSION_FIELD: {"$exists": True}}
+        elif isinstance(watermark, datetime.datetime):
+            query = {VERSION_FIELD: {"$gt": watermark - self.overlap}}
+        else:
+            query = {VERSION_FIELD: {"$gt": watermark - self.overlap.total_seconds()}}
+        upserts = list(self.collection.find(query, document_projection()))
+
+        deleted_ids = []
+        if scan_ids or self.polls % self.id_scan_every == 0:
+            live_ids = {str(doc["_id"]) for doc in self.collection.find({}, {"_id": 1})}
+            deleted_ids = [product_id for product_id in index.ids if product_id not in live_ids]
+        return upserts, deleted_ids
+
+
+_syncer = None
+
+
+def start_index_sync(collection, interval):
+    """Start the background syncer once per process."""
+    global _syncer
+    if _syncer is None and interval > 0:
+        _syncer = IndexSyncer(collection, interval=interval).start()
+    return _syncer
@@ -0,0 +1,117 @@
+import re
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+LEXICAL_FIELDS = ("name", "brand", "category")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens with a light plural strip ('pods' -> 'pod')."""
+    tokens = []
+    for token in TOKEN_RE.findall(str(text or "").lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index over product name, brand and category, scored with BM25.
+
+    Postings are stored CSR-style (one offsets array into flat doc id and
+    weight arrays), and each posting already holds its full BM25 term
+    weight, so a query is a sum over the posting lists of its terms.
+    """
+
+    def __init__(self, vocabulary, offsets, docs, weights, size):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.size = size
+
+    @classmethod
+    def from_products(cls, products, k1=1.2, b=0.75):
+        vocabulary = {}
+        term_ids = []
+        doc_ids = []
+        lengths = []
+        for row, product in enumerate(products):
+            tokens = tokenize(" ".join(str(product.get(field, "")) for field in LEXICAL_FIELDS))
+            lengths.append(len(tokens))
+            for token in tokens:
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_ids.append(row)
+
+        size = len(lengths)
+        if not term_ids:
+            return cls({}, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32), size)
+
+        # Count (term, doc) pairs to get term frequencies, grouped by term
+        pairs = np.unique(np.array(term_ids, dtype=np.int64) * size + np.array(doc_ids, dtype=np.int64), return_counts=True)
+        terms, docs = np.divmod(pairs[0], size)
+        tf = pairs[1].astype(np.float32)
+
+        lengths = np.array(lengths, dtype=np.float32)
+        average = max(float(lengths.mean()), 1.0)
+        df = np.bincount(terms, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((size - df + 0.5) / (df + 0.5))
+        weights = idf[terms] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[docs] / average))
+
+        offsets = np.concatenate([[0], np.cumsum(df.astype(np.int64))]).astype(np.int64)
+        return cls(vocabulary, offsets, docs.astype(np.int32), weights.astype(np.float32), size)
+
+    def __len__(self):
+        return self.size
+
+    def save(self, path):
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.array(terms, dtype=str),
+                offsets=self.offsets,
+                docs=self.docs,
+                weights=self.weights,
+                size=self.size,
+            )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        vocabulary = {term: i for i, term in enumerate(data["vocabulary"].tolist())}
+        return cls(vocabulary, data["offsets"], data["docs"], data["weights"], int(data["size"]))
+
+    def search(self, text, k, rows=None):
+        """Return (row ids, scores) of the k best lexical matches, best first.
+
+        `rows` optionally restricts results to a sorted array of allowed rows.
+        """
+        term_ids = {self.vocabulary[token] for token in tokenize(text) if token in self.vocabulary}
+        if not term_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        docs = np.concatenate([self.docs[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if rows is not None:
+            allowed = np.isin(candidates, rows, assume_unique=True)
+            candidates, scores = candidates[allowed], scores[allowed]
+
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top].astype(np.int64), scores[top].astype(np.float32)
+
+
+def reciprocal_rank_fusion(rankings, k, constant=60):
+    """Fuse ranked lists of row ids; each list contributes 1 / (constant + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[int(row)] = scores.get(int(row), 0.0) + 1.0 / (constant + rank + 1)
+    fused = sorted(scores, key=lambda row: -scores[row])[:k]
+    return np.array(fused, dtype=np.int64)
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+from langchain_core.runnables import Runnable
+
+
+def normalize_prompt_value(value):
+    """Normalize a prompt variable so trivially different inputs share a key."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def get_model_name(llm):
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+
+class CachedRunnable(Runnable):
+    """Wraps a string-producing chain with a persistent response cache.
+
+    Keys combine the chain name, the LLM model name and the normalized
+    prompt variables, so a prompt or model change never serves stale text.
+    The async paths run cache reads and writes in a thread, so a slow SQLite
+    write never stalls the event loop.
+    """
+
+    def __init__(self, runnable, cache, namespace, model_name=""):
+        self.runnable = runnable
+        self.cache = cache
+        self.namespace = namespace
+        self.model_name = model_name
+
+    def cache_key(self, input):
+        variables = {key: normalize_prompt_value(value) for key, value in input.items()}
+        raw = json.dumps([self.namespace, self.model_name, variables], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _store(self, key, response):
+        if response and response.strip():
+            self.cache.set(key, response)
+
+    async def _astore(self, key, response):
+        await asyncio.to_thread(self._store, key, response)
+
+    def invoke(self, input, config=None, **kwargs):
+        key = self.cache_key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = self.runnable.invoke(input, config, **kwargs)
+        self._store(key, response)
+        return response
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key = self.cache_key(input)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+
+        response = await self.runnable.ainvoke(input, config, **kwargs)
+        await self._astore(key, response)
+        return response
+
+    def stream(self, input, config=None, **kwargs):
+        key = self.cache_key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in self.runnable.stream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, "".join(chunks))
+
+    async def astream(self, input, config=None, **kwargs):
+        key = self.cache_key(input)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in self.runnable.astream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        await self._astore(key, "".join(chunks))
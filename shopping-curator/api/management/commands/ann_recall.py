@@ -0,0 +1,93 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from api.ann import get_backend, top_k_rows
+from api.db import get_products_collection
+from api.product_index import ProductIndex
+from .build_ann_index import parse_params
+
+
+class Command(BaseCommand):
+    help = "Report recall@k and latency of an ANN backend against exact search."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default="ivf", help="ivf or hnsw")
+        parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="Fixed backend parameter (repeatable)")
+        parser.add_argument("--sweep", default=None, metavar="KEY=V1,V2,...",
+                            help="Query-time parameter to sweep, e.g. nprobe=1,4,16 or ef_search=16,64,256")
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--rerank", type=int, default=0, help="Shortlist multiplier for exact re-ranking")
+        parser.add_argument("--queries", type=int, default=500, help="Number of sampled queries")
+        parser.add_argument("--terms-file", default=None,
+                            help="Encode real search terms (one per line) instead of perturbed catalog rows")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        index = ProductIndex.from_collection(get_products_collection())
+        if not len(index):
+            raise CommandError("No products with embeddings found")
+
+        queries = self.load_queries(index, options)
+        k = options["k"]
+        exact = top_k_rows(queries @ index.matrix.T, k)
+
+        params = parse_params(options["param"])
+        sweep_key, sweep_values = None, [None]
+        if options["sweep"]:
+            sweep_key, _, values = options["sweep"].partition("=")
+            sweep_values = [int(value) for value in values.split(",")]
+
+        started = time.perf_counter()
+        backend = get_backend(options["backend"], **params).build(index.matrix)
+        build_seconds = time.perf_counter() - started
+
+        results = []
+        for value in sweep_values:
+            if sweep_key:
+                setattr(backend, sweep_key, value)
+            index.attach_ann(backend, rerank=options["rerank"])
+
+            started = time.perf_counter()
+            found = index.search_ids(queries, k)
+            elapsed = time.perf_counter() - started
+
+            hits = sum(len(set(row.tolist()) & set(truth.tolist())) for row, truth in zip(found, exact))
+            results.append({
+                "backend": backend.name,
+                "params": dict(params, **({sweep_key: value} if sweep_key else {})),
+                "rerank": options["rerank"],
+                "k": k,
+                "recall": hits / (len(queries) * min(k, len(index))),
+                "ms_per_query": 1000 * elapsed / len(queries),
+                "qps": len(queries) / elapsed if elapsed else float("inf"),
+                "build_seconds": build_seconds,
+                "catalog_size": len(index),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{backend.name} over {len(index)} products, {len(queries)} queries, k={k}")
+        for row in results:
+            self.stdout.write(
+                f"  {row['params']}  recall@{k}={row['recall']:.3f}  "
+                f"{row['ms_per_query']:.3f} ms/query  {row['qps']:.0f} qps"
+            )
+
+    def load_queries(self, index, options):
+        if options["terms_file"]:
+            from sentence_transformers import SentenceTransformer
+            with open(options["terms_file"], encoding="utf-8") as f:
+                terms = [line.strip() for line in f if line.strip()]
+            queries = SentenceTransformer("all-MiniLM-L6-v2").encode(terms)
+        else:
+            # Perturbed catalog rows stand in for real queries
+            rng = np.random.default_rng(0)
+            rows = rng.choice(len(index), size=min(options["queries"], len(index)), replace=False)
+            queries = index.matrix[rows] + rng.normal(0, 0.05, size=(len(rows), index.matrix.shape[1]))
+
+        queries = np.asarray(queries, dtype=np.float32)
+        return queries / np.linalg.norm(queries, axis=1, keepdims=True)
@@ -0,0 +1,44 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.ann import get_backend, save_backend
+from api.db import get_products_collection
+from api.product_index import ProductIndex
+
+
+class Command(BaseCommand):
+    help = "Build an ANN index over the product embeddings and save it for workers to load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default=os.getenv("ANN_BACKEND", "ivf"), help="ivf or hnsw")
+        parser.add_argument("--output", default=os.getenv("ANN_INDEX_PATH"), help="Where to save the index")
+        parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="Backend parameter, e.g. nlist=1024 or m=32 (repeatable)")
+
+    def handle(self, *args, **options):
+        if not options["output"]:
+            raise CommandError("Pass --output or set ANN_INDEX_PATH")
+        params = parse_params(options["param"])
+
+        index = ProductIndex.from_collection(get_products_collection())
+        if not len(index):
+            raise CommandError("No products with embeddings found")
+
+        started = time.perf_counter()
+        backend = get_backend(options["backend"], **params).build(index.matrix)
+        elapsed = time.perf_counter() - started
+        save_backend(backend, options["output"], index.matrix)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {backend.name} index over {len(index)} products in {elapsed:.1f}s -> {options['output']}"
+        ))
+
+
+def parse_params(pairs):
+    params = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        if not value:
+            raise CommandError(f"Expected KEY=VALUE, got '{pair}'")
+        params[key.strip()] = int(value)
+    return params
@@ -0,0 +1,65 @@
+import datetime
+import os
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.db import get_products_collection
+from api.embedding_cache import normalize_term
+from api.models import Request
+from api.product_index import RETRIEVAL_MODES, get_product_index
+from api.request_log import item_term
+from api.resources import registry
+from api.term_table import TermTable
+
+
+class Command(BaseCommand):
+    help = "Precompute top-k product ids for a vocabulary of common search terms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=os.getenv("TERM_TABLE_PATH") or "term_table.npz")
+        parser.add_argument("--vocabulary", default=None, help="Search terms, one per line")
+        parser.add_argument("--from-log", action="store_true", help="Use the most requested terms in the request log")
+        parser.add_argument("--days", type=float, default=30, help="Request log window for --from-log")
+        parser.add_argument("--limit", type=int, default=5000, help="Most frequent terms taken from the log")
+        parser.add_argument("--k", type=int, default=10, help="Products stored per term")
+        parser.add_argument("--mode", choices=RETRIEVAL_MODES, default=os.getenv("RETRIEVAL_MODE", "vector"))
+
+    def handle(self, *args, **options):
+        terms = []
+        if options["vocabulary"]:
+            with open(options["vocabulary"], encoding="utf-8") as f:
+                terms.extend(line.strip() for line in f if line.strip())
+        if options["from_log"]:
+            terms.extend(logged_terms(options["days"], options["limit"]))
+        if not options["vocabulary"] and not options["from_log"]:
+            # Default vocabulary: every term of the ingredient taxonomy
+            terms.extend(registry.get("taxonomy").terms)
+        if not terms:
+            raise CommandError("The vocabulary is empty")
+
+        # Same catalog source as the workers, so the versions match
+        index = get_product_index(get_products_collection(), os.getenv("INDEX_SNAPSHOT_DIR"))
+        if not len(index):
+            raise CommandError("No products with embeddings found")
+
+        started = time.perf_counter()
+        encoder = registry.get("encoder")
+        table = TermTable.build(index, terms, encoder.encode, options["k"], options["mode"])
+        table.save(options["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored top {table.k} products for {len(table)} terms in {options['output']} "
+            f"({time.perf_counter() - started:.1f}s, catalog {table.catalog_version[:12]}, {table.mode} mode)"
+        ))
+
+
+def logged_terms(days, limit):
+    """The `limit` most frequent search terms in the request log over the last `days`."""
+    since = timezone.now() - datetime.timedelta(days=days)
+    counts = Counter()
+    for items in Request.objects.filter(created_at__gte=since).values_list("items", flat=True).iterator(chunk_size=2000):
+        for item in items or []:
+            term = item_term(item)
+            if term:
+                counts[normalize_term(term)] += 1
+    return [term for term, _ in counts.most_common(limit)]
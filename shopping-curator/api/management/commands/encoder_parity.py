@@ -0,0 +1,88 @@
+import json
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from api.ann import top_k_rows
+from api.db import get_products_collection
+from api.encoders import OnnxEncoder, load_sentence_transformer
+from api.product_index import ProductIndex
+
+# Lowest acceptable cosine between the fp32 and ONNX embedding of a term
+COSINE_TOLERANCE = 0.98
+
+DEFAULT_TERMS = [
+    "milk", "eggs", "bread", "butter", "cheese", "chicken breast", "ground beef", "salmon",
+    "rice", "pasta", "tomato sauce", "olive oil", "garlic", "onion", "potato", "apples",
+    "bananas", "yogurt", "coffee", "tea", "cereal", "peanut butter", "chocolate chips",
+    "paper towels", "laundry detergent", "toothpaste", "shampoo", "dog food", "diapers",
+    "birthday cake", "balloons", "hot sauce", "black pepper", "cinnamon", "almond milk",
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the ONNX encoder against the fp32 SentenceTransformer: cosine drift, top-k overlap and speed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model-dir", default=os.getenv("ENCODER_ONNX_DIR", "onnx-encoder"))
+        parser.add_argument("--fp32", action="store_true", help="Use the unquantized ONNX model")
+        parser.add_argument("--threads", type=int, default=None)
+        parser.add_argument("--terms-file", default=None, help="Search terms, one per line")
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        terms = DEFAULT_TERMS
+        if options["terms_file"]:
+            with open(options["terms_file"], encoding="utf-8") as f:
+                terms = [line.strip() for line in f if line.strip()]
+
+        reference = load_sentence_transformer(options["threads"])
+        candidate = OnnxEncoder(options["model_dir"], threads=options["threads"], quantized=not options["fp32"])
+
+        expected, reference_seconds = timed_encode(reference, terms)
+        actual, candidate_seconds = timed_encode(candidate, terms)
+        cosines = np.sum(normalize(expected) * normalize(actual), axis=1)
+
+        result = {
+            "model": candidate.path,
+            "terms": len(terms),
+            "cosine_mean": float(cosines.mean()),
+            "cosine_min": float(cosines.min()),
+            "fp32_ms_per_term": 1000 * reference_seconds / len(terms),
+            "onnx_ms_per_term": 1000 * candidate_seconds / len(terms),
+            "speedup": reference_seconds / candidate_seconds if candidate_seconds else float("inf"),
+        }
+
+        index = ProductIndex.from_collection(get_products_collection())
+        if len(index):
+            k = options["k"]
+            expected_top = top_k_rows(normalize(expected) @ index.matrix.T, k)
+            actual_top = top_k_rows(normalize(actual) @ index.matrix.T, k)
+            overlap = [len(set(a.tolist()) & set(b.tolist())) / min(k, len(index))
+                       for a, b in zip(expected_top, actual_top)]
+            result[f"top{k}_overlap_mean"] = float(np.mean(overlap))
+            result[f"top{k}_overlap_min"] = float(np.min(overlap))
+        else:
+            self.stderr.write("No catalog found; skipping top-k overlap")
+
+        result["within_tolerance"] = result["cosine_min"] >= COSINE_TOLERANCE
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            for key, value in result.items():
+                self.stdout.write(f"{key:<22} {value:.4f}" if isinstance(value, float) else f"{key:<22} {value}")
+        # Fail in both output modes so CI gates on either
+        if not result["within_tolerance"]:
+            raise CommandError(f"Cosine drift above tolerance (min cosine < {COSINE_TOLERANCE})")
+
+
+def timed_encode(encoder, terms):
+    encoder.encode(terms[:2])  # warm-up
+    started = time.perf_counter()
+    embeddings = np.asarray(encoder.encode(terms), dtype=np.float32)
+    return embeddings, time.perf_counter() - started
+
+
+def normalize(matrix):
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
@@ -0,0 +1,54 @@
+import os
+from django.core.management.base import BaseCommand
+
+HF_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class Command(BaseCommand):
+    help = "Export all-MiniLM-L6-v2 to ONNX and write an int8 dynamically quantized copy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=os.getenv("ENCODER_ONNX_DIR", "onnx-encoder"))
+        parser.add_argument("--no-quantize", action="store_true", help="Only write the fp32 model")
+        parser.add_argument("--opset", type=int, default=17)
+
+    def handle(self, *args, **options):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        output = options["output"]
+        os.makedirs(output, exist_ok=True)
+
+        tokenizer = AutoTokenizer.from_pretrained(HF_MODEL)
+        model = AutoModel.from_pretrained(HF_MODEL).eval()
+        tokenizer.save_pretrained(output)
+
+        sample = tokenizer(["milk", "whole wheat bread"], padding=True, return_tensors="pt")
+        fp32_path = os.path.join(output, "model.onnx")
+        dynamic = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": dynamic,
+                    "attention_mask": dynamic,
+                    "token_type_ids": dynamic,
+                    "last_hidden_state": dynamic,
+                },
+                opset_version=options["opset"],
+            )
+        self.stdout.write(f"Wrote {fp32_path} ({os.path.getsize(fp32_path) / 1e6:.1f} MB)")
+
+        if not options["no_quantize"]:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            int8_path = os.path.join(output, "model_int8.onnx")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+            self.stdout.write(f"Wrote {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} MB)")
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done. Check it with 'manage.py encoder_parity' before setting ENCODER_BACKEND=onnx"
+        ))
@@ -0,0 +1,35 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from api.ann import get_backend
+from api.db import get_products_collection
+from api.product_index import ProductIndex
+from api.snapshot import export_snapshot
+from .build_ann_index import parse_params
+
+
+class Command(BaseCommand):
+    help = "Export the product catalog to a versioned, memory-mappable snapshot and publish it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=os.getenv("INDEX_SNAPSHOT_DIR"), help="Snapshot root directory")
+        parser.add_argument("--keep", type=int, default=3, help="Versions to keep on disk")
+        parser.add_argument("--ann", default=None, help="Also build an ANN index (ivf or hnsw)")
+        parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="ANN backend parameter (repeatable)")
+
+    def handle(self, *args, **options):
+        if not options["dir"]:
+            raise CommandError("Pass --dir or set INDEX_SNAPSHOT_DIR")
+
+        index = ProductIndex.from_collection(get_products_collection())
+        if not len(index):
+            raise CommandError("No products with embeddings found")
+
+        backend = None
+        if options["ann"]:
+            backend = get_backend(options["ann"], **parse_params(options["param"])).build(index.matrix)
+
+        version = export_snapshot(index, options["dir"], backend, keep=options["keep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Published snapshot {version} with {len(index)} products to {options['dir']}"
+        ))
@@ -0,0 +1,76 @@
+import datetime
+import json
+from collections import Counter
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.embedding_cache import normalize_term
+from api.models import Request
+from api.request_log import item_term
+
+
+class Command(BaseCommand):
+    help = "Report the most requested search terms and recipes, and stage timings, from the request log."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=7, help="Look back this many days")
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument("--mode", choices=["shopping", "recipe"], default=None)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - datetime.timedelta(days=options["days"])
+        rows = Request.objects.filter(created_at__gte=since)
+        if options["mode"]:
+            rows = rows.filter(mode=options["mode"])
+
+        terms = Counter()
+        recipes = Counter()
+        timings = {}
+        requests = 0
+        errors = 0
+        for mode, recipe_name, items, stages, status in rows.values_list(
+            "mode", "recipe_name", "items", "timings", "status"
+        ).iterator(chunk_size=2000):
+            requests += 1
+            errors += status >= 400
+            if mode == "recipe" and recipe_name:
+                recipes[normalize_term(recipe_name)] += 1
+            for item in items or []:
+                term = item_term(item)
+                if term:
+                    terms[normalize_term(term)] += 1
+            for stage, seconds in (stages or {}).items():
+                timings.setdefault(stage, []).append(seconds)
+
+        limit = options["limit"]
+        result = {
+            "since": since.isoformat(),
+            "requests": requests,
+            "errors": errors,
+            "terms": terms.most_common(limit),
+            "recipes": recipes.most_common(limit),
+            "timings_ms": {
+                stage: {
+                    "p50": round(1000 * float(np.percentile(values, 50)), 1),
+                    "p95": round(1000 * float(np.percentile(values, 95)), 1),
+                    "count": len(values),
+                }
+                for stage, values in sorted(timings.items())
+            },
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"{requests} requests since {since:%Y-%m-%d %H:%M} ({errors} errors)")
+        for title, counts in (("Search terms", result["terms"]), ("Recipes", result["recipes"])):
+            if counts:
+                self.stdout.write(f"\n{title}:")
+                for name, count in counts:
+                    self.stdout.write(f"  {count:>7}  {name}")
+        if result["timings_ms"]:
+            self.stdout.write("\nStage timings (ms):")
+            for stage, stats in result["timings_ms"].items():
+                self.stdout.write(f"  {stage:<14} p50 {stats['p50']:>8}  p95 {stats['p95']:>8}  n={stats['count']}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Load every heavy resource and print how long each one took."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fork-safe-only", action="store_true",
+                            help="Only load what a preloading master would load")
+
+    def handle(self, *args, **options):
+        from api.views import warm_up
+        warm_up(fork_safe_only=options["fork_safe_only"])
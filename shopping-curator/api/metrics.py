@@ -0,0 +1,118 @@
+import bisect
+import threading
+
+# Upper bounds in seconds, from cache hits up to slow LLM and OCR calls
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{name}_bucket{format_labels(labels, le=le)} {cumulative}"
+        yield f"{name}_sum{format_labels(labels)} {self.sum:.6f}"
+        yield f"{name}_count{format_labels(labels)} {self.count}"
+
+
+class RequestMetrics:
+    """Per-endpoint request latency and status counts, and per-stage latency.
+
+    Observing a request takes one short lock per request, so recording is
+    cheap next to the work it measures.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.stages = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, total, timings):
+        with self._lock:
+            self.requests.setdefault(endpoint, Histogram()).observe(total)
+            key = (endpoint, str(status))
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            for stage, seconds in timings.items():
+                self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def samples(self):
+        with self._lock:
+            yield "# HELP curator_requests_total Requests served, by endpoint and status."
+            yield "# TYPE curator_requests_total counter"
+            for (endpoint, status), count in sorted(self.statuses.items()):
+                yield f"curator_requests_total{format_labels({'endpoint': endpoint, 'status': status})} {count}"
+            yield "# HELP curator_request_duration_seconds Request latency until the response is complete."
+            yield "# TYPE curator_request_duration_seconds histogram"
+            for endpoint, histogram in sorted(self.requests.items()):
+                yield from histogram.samples("curator_request_duration_seconds", {"endpoint": endpoint})
+            yield "# HELP curator_stage_duration_seconds Time spent in each pipeline stage per request."
+            yield "# TYPE curator_stage_duration_seconds histogram"
+            for stage, histogram in sorted(self.stages.items()):
+                yield from histogram.samples("curator_stage_duration_seconds", {"stage": stage})
+
+
+request_metrics = RequestMetrics()
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def metric(name, kind, help_text, values):
+    """Samples for one metric family; `values` is a list of (labels, value)."""
+    if not values:
+        return []
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{format_labels(labels)} {value}" for labels, value in values)
+    return lines
+
+
+def cache_samples(caches):
+    """Hit, miss and size metrics for {name: stats dict} of the loaded caches."""
+    hits, misses, entries = [], [], []
+    for name, stats in caches.items():
+        labels = {"cache": name}
+        hits.append((labels, stats.get("hits", 0)))
+        misses.append((labels, stats.get("misses", 0)))
+        if "size" in stats:
+            entries.append((labels, stats["size"]))
+    return (
+        metric("curator_cache_hits_total", "counter", "Cache lookups that hit.", hits)
+        + metric("curator_cache_misses_total", "counter", "Cache lookups that missed.", misses)
+        + metric("curator_cache_entries", "gauge", "Entries currently cached.", entries)
+    )
+
+
+def render(resources, caches, extra=()):
+    """Prometheus text exposition of request, stage, cache and resource metrics."""
+    lines = list(request_metrics.samples())
+    lines.extend(cache_samples(caches))
+    lines.extend(metric(
+        "curator_resource_loaded", "gauge", "1 when a lazily built resource (model, cache, client) is loaded.",
+        [({"resource": name}, int(loaded)) for name, loaded in resources.status().items()]
+    ))
+    lines.extend(metric(
+        "curator_resource_load_seconds", "gauge", "Seconds it took to build each resource.",
+        [({"resource": name}, entry["seconds"]) for name, entry in resources.report().items()]
+    ))
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
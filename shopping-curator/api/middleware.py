@@ -0,0 +1,64 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from .metrics import request_metrics
+from .request_log import RequestTrace, current_trace
+
+
+def endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.url_name or match.view_name if match else "unmatched"
+
+
+def finish(trace, request, status):
+    request_metrics.observe(endpoint_name(request), status, trace.elapsed(), trace.timings)
+
+
+async def traced_stream(stream, trace, request, status):
+    """Pass a streaming body through, then record the request once the body is sent."""
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        finish(trace, request, status)
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Trace every request: Server-Timing header plus per-stage latency histograms.
+
+    Stages report through a context variable (see api.request_log), so
+    views only call record_stage. A streamed body records its metrics when
+    it finishes, and its header lists the stages done before the first byte.
+    """
+    def start(request):
+        trace = RequestTrace()
+        return trace, current_trace.set(trace)
+
+    def end(trace, request, response):
+        response["Server-Timing"] = trace.server_timing()
+        # The UI runs on another origin; let it read the timings too
+        response["Timing-Allow-Origin"] = "*"
+        if response.streaming and response.is_async:
+            response.streaming_content = traced_stream(response.streaming_content, trace, request, response.status_code)
+        else:
+            finish(trace, request, response.status_code)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            trace, token = start(request)
+            try:
+                response = await get_response(request)
+            finally:
+                current_trace.reset(token)
+            return end(trace, request, response)
+    else:
+        def middleware(request):
+            trace, token = start(request)
+            try:
+                response = get_response(request)
+            finally:
+                current_trace.reset(token)
+            return end(trace, request, response)
+
+    return middleware
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='items',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='mode',
+            field=models.CharField(default='shopping', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='recipe_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='servings',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='status',
+            field=models.PositiveSmallIntegerField(default=200),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -3,7 +3,15 @@ from django.db import models
 class Request(models.Model):
     text = models.TextField(blank=True, null=True) 
     image = models.ImageField(upload_to='requests/', blank=True, null=True)  
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    mode = models.CharField(max_length=16, default="shopping")
+    recipe_name = models.CharField(max_length=200, blank=True, default="")
+    servings = models.PositiveSmallIntegerField(blank=True, null=True)
+    # Item names (shopping) or ingredients (recipe) the request resolved to
+    items = models.JSONField(default=list, blank=True)
+    # Seconds spent per pipeline stage, plus "total"
+    timings = models.JSONField(default=dict, blank=True)
+    status = models.PositiveSmallIntegerField(default=200)
 
     def __str__(self):
         return self.text if self.text else f"Image"
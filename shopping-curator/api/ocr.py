@@ -0,0 +1,180 @@
+import base64
+import hashlib
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency, uploads are sent unmodified without it
+    Image = None
+
+OCR_MODEL = "mistral-ocr-latest"
+# Longest image side sent to OCR; phone photos are usually 3-4x larger
+MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", 2000))
+JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", 85))
+# Images under this size and resolution are sent as uploaded
+RECOMPRESS_OVER_BYTES = int(os.getenv("OCR_RECOMPRESS_OVER_BYTES", 1024 * 1024))
+
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF", "application/pdf"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+
+
+def sniff_mime(header):
+    """Detect the real MIME type from the first bytes of a file, or None."""
+    for magic, mime in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return mime
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def read_upload(file_obj):
+    """Return an upload's bytes and their sha256 hex.
+
+    The upload is held in memory whole, since Pillow and the base64 OCR
+    payload both need it. Uploads Django already keeps in memory are
+    hashed in place; spooled ones are read and hashed chunk by chunk.
+    """
+    if isinstance(getattr(file_obj, "file", None), io.BytesIO):
+        data = file_obj.file.getvalue()
+        return data, hashlib.sha256(data).hexdigest()
+
+    digest = hashlib.sha256()
+    chunks = []
+    for chunk in file_obj.chunks() if hasattr(file_obj, "chunks") else iter(lambda: file_obj.read(64 * 1024), b""):
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def perceptual_hash(image, size=16):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy."""
+    pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(size):
+        line = pixels[row * (size + 1):(row + 1) * (size + 1)]
+        for left, right in zip(line, line[1:]):
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+
+class PreparedImage:
+    """An upload ready for OCR: payload bytes, MIME type and cache keys."""
+
+    def __init__(self, data, mime, content_hash, visual_hash=None, original_size=None):
+        self.data = data
+        self.mime = mime
+        self.content_hash = content_hash
+        self.visual_hash = visual_hash
+        self.original_size = original_size if original_size is not None else len(data)
+
+    def data_url(self):
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+    def document(self):
+        """The `document` argument for the Mistral OCR API."""
+        if self.mime == "application/pdf":
+            return {"type": "document_url", "document_url": self.data_url()}
+        return {"type": "image_url", "image_url": self.data_url()}
+
+
+def prepare_image(file_obj, max_side=MAX_SIDE, quality=JPEG_QUALITY):
+    """Hash an upload and shrink it to an OCR-sufficient resolution.
+
+    Large photos are decoded at reduced size (JPEG draft mode), rotated
+    upright from EXIF, and recompressed as JPEG when that is smaller than
+    the upload. PDFs and anything Pillow cannot open are passed through.
+    """
+    data, content_hash = read_upload(file_obj)
+    mime = sniff_mime(data[:16])
+    if mime is None:
+        raise ValueError("Unsupported file type; upload a JPEG, PNG, WebP, GIF, BMP, TIFF or PDF")
+    if Image is None or mime == "application/pdf":
+        return PreparedImage(data, mime, content_hash)
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format == "JPEG":
+            # Let the decoder skip detail we are about to throw away
+            image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        visual_hash = perceptual_hash(image)
+        too_large = max(image.size) > max_side or len(data) > RECOMPRESS_OVER_BYTES
+        if not too_large and mime in ("image/jpeg", "image/png"):
+            return PreparedImage(data, mime, content_hash, visual_hash)
+
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+        if output.tell() >= len(data) and mime in ("image/jpeg", "image/png"):
+            return PreparedImage(data, mime, content_hash, visual_hash)
+        return PreparedImage(output.getvalue(), "image/jpeg", content_hash, visual_hash, len(data))
+    except Exception as e:
+        # Pillow cannot decode every format it sniffs (e.g. HEIC without a plugin)
+        print(f"Image preprocessing skipped: {e}")
+        return PreparedImage(data, mime, content_hash)
+
+
+class OCRService:
+    """Mistral OCR with a reused client and a text cache keyed by image hash.
+
+    Exact re-uploads hit the cache by content hash. With `match_visual`,
+    re-encoded copies of the same photo (resized, recompressed, metadata
+    stripped) also hit through a 256-bit perceptual hash.
+    """
+
+    def __init__(self, client, cache=None, match_visual=False, model=OCR_MODEL):
+        self.client = client
+        self.cache = cache
+        self.match_visual = match_visual
+        self.model = model
+        self.calls = 0
+        self.bytes_uploaded = 0
+        self.bytes_sent = 0
+
+    def cache_keys(self, prepared):
+        keys = [f"sha256:{prepared.content_hash}"]
+        if self.match_visual and prepared.visual_hash:
+            keys.append(f"dhash:{prepared.visual_hash}")
+        return keys
+
+    def extract_text(self, file_obj):
+        """Return the markdown text of an uploaded image or PDF."""
+        prepared = prepare_image(file_obj)
+        keys = self.cache_keys(prepared)
+        if self.cache is not None:
+            cached = self.cache.get_many(keys)
+            for key in keys:
+                if key in cached:
+                    return cached[key]
+
+        self.calls += 1
+        response = self.client.ocr.process(
+            model=self.model,
+            document=prepared.document(),
+            include_image_base64=False  # Do not return the image in response
+        )
+        text = "\n".join(page.markdown.strip() for page in response.pages)
+        self.bytes_uploaded += prepared.original_size
+        self.bytes_sent += len(prepared.data)
+
+        if self.cache is not None and text.strip():
+            self.cache.set_many({key: text for key in keys})
+        return text
+
+    def stats(self):
+        stats = {"calls": self.calls, "bytes_uploaded": self.bytes_uploaded, "bytes_sent": self.bytes_sent}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
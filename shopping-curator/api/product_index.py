@@ -0,0 +1,413 @@
+import hashlib
+import os
+import threading
+from functools import cached_property
+import numpy as np
+from .ann import backend_params_from_env, get_backend, load_backend, save_backend, top_k_rows
+from .filters import ProductColumns
+from .lexical import BM25Index, reciprocal_rank_fusion
+
+# Fields kept in the side table; the embedding lives only in the matrix
+PRODUCT_FIELDS = ["name", "brand", "price", "category", "link"]
+VERSION_FIELD = "updated_at"
+# Upper bound on query x product scores held in memory at once (64 MB of float32)
+SCORE_BLOCK_ELEMENTS = 16 * 1024 * 1024
+# Filters keeping at least this share of the catalog score every row and
+# mask out the rest instead of copying the selected rows
+FILTER_MASK_SHARE = float(os.getenv("FILTER_MASK_SHARE", 0.25))
+
+# Retrieval modes: "vector" (embeddings only), "hybrid" (vector and BM25
+# rankings fused with reciprocal-rank fusion) and "lexical" (BM25 shortlist
+# re-ranked exactly by vector score)
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+# Candidates taken from each ranking before fusion
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", 50))
+# BM25 shortlist size for the "lexical" mode
+LEXICAL_SHORTLIST = int(os.getenv("LEXICAL_SHORTLIST", 200))
+
+
+def normalize_rows(embeddings):
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def product_metadata(doc):
+    return {field: doc[field] for field in PRODUCT_FIELDS if field in doc}
+
+
+class ProductIndex:
+    """In-memory product catalog: a normalized float32 matrix plus metadata.
+
+    An index is never mutated once built; `apply_changes` returns a new one
+    so readers holding a reference always see a consistent catalog.
+    """
+
+    def __init__(self, embeddings, products, ids=None, versions=None, normalized=False):
+        matrix = embeddings if normalized else normalize_rows(embeddings)
+        if matrix.ndim != 2 or matrix.shape[0] != len(products):
+            raise ValueError("Embeddings must be a 2D array with one row per product")
+
+        self.matrix = matrix
+        self.products = products
+        self.ids = ids if ids is not None else list(range(len(products)))
+        self.versions = versions if versions is not None else [None] * len(products)
+        self.ann = None
+        self.rerank = 0
+
+    def attach_ann(self, backend, rerank=0):
+        """Route searches through an ANN backend.
+
+        With `rerank` > 0 the backend returns a shortlist of top_k * rerank
+        candidates which is re-scored exactly against the float32 matrix.
+        """
+        self.ann = backend
+        self.rerank = rerank
+
+    def __len__(self):
+        return len(self.products)
+
+    @cached_property
+    def positions(self):
+        """Map of product id to matrix row, built on first use."""
+        return {product_id: row for row, product_id in enumerate(self.ids)}
+
+    @cached_property
+    def columns(self):
+        """Parsed prices and category/brand codes used by filters, built on first use."""
+        return ProductColumns.from_products(self.products)
+
+    @cached_property
+    def lexical(self):
+        """BM25 inverted index over name, brand and category, built on first use."""
+        return BM25Index.from_products(self.products)
+
+    @cached_property
+    def watermark(self):
+        """Latest `updated_at` seen in the catalog, or None if documents aren't versioned."""
+        versions = [version for version in self.versions if version is not None]
+        return max(versions) if versions else None
+
+    @cached_property
+    def catalog_version(self):
+        """Identifies what searches depend on: product ids and every vector.
+
+        Metadata edits (price, name) leave it unchanged, since results
+        resolve them through the live index.
+        """
+        digest = hashlib.sha1(str(self.matrix.shape).encode("utf-8"))
+        digest.update(np.ascontiguousarray(self.matrix, dtype=np.float32).data)
+        digest.update("\n".join(str(product_id) for product_id in self.ids).encode("utf-8"))
+        return digest.hexdigest()
+
+    def known_catalog_version(self):
+        """catalog_version if already computed or loaded, else None; never hashes the catalog."""
+        return self.__dict__.get("catalog_version")
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Build an index from product documents carrying an 'embedding' field."""
+        embeddings = []
+        products = []
+        ids = []
+        versions = []
+        for doc in documents:
+            if not doc.get("embedding"):
+                continue
+            embeddings.append(doc["embedding"])
+            products.append(product_metadata(doc))
+            ids.append(str(doc["_id"]) if "_id" in doc else len(ids))
+            versions.append(doc.get(VERSION_FIELD))
+
+        if not products:
+            return cls(np.zeros((0, 0), dtype=np.float32), [])
+        return cls(embeddings, products, ids, versions)
+
+    @classmethod
+    def from_collection(cls, collection):
+        """Build an index from a Mongo products collection."""
+        return cls.from_documents(collection.find({}, document_projection()))
+
+    def apply_changes(self, upserts=(), deleted_ids=()):
+        """Return a new index with documents upserted and ids removed."""
+        deleted = {str(product_id) for product_id in deleted_ids}
+        updates = {}
+        appended = []
+        for doc in upserts:
+            product_id = str(doc["_id"])
+            if not doc.get("embedding"):
+                deleted.add(product_id)
+            elif product_id in self.positions:
+                updates[self.positions[product_id]] = doc
+            else:
+                appended.append(doc)
+
+        matrix = self.matrix
+        products = list(self.products)
+        ids = list(self.ids)
+        versions = list(self.versions)
+
+        if updates:
+            matrix = matrix.copy()
+            rows = list(updates)
+            matrix[rows] = normalize_rows([updates[row]["embedding"] for row in rows])
+            for row, doc in updates.items():
+                products[row] = product_metadata(doc)
+                versions[row] = doc.get(VERSION_FIELD)
+
+        if appended:
+            new_rows = normalize_rows([doc["embedding"] for doc in appended])
+            matrix = np.vstack([matrix, new_rows]) if len(matrix) else new_rows
+            products.extend(product_metadata(doc) for doc in appended)
+            ids.extend(str(doc["_id"]) for doc in appended)
+            versions.extend(doc.get(VERSION_FIELD) for doc in appended)
+
+        keep = None
+        removed = [self.positions[product_id] for product_id in deleted if product_id in self.positions]
+        if removed:
+            keep = np.ones(len(products), dtype=bool)
+            keep[removed] = False
+            matrix = matrix[keep]
+            products = [product for product, kept in zip(products, keep) if kept]
+            ids = [product_id for product_id, kept in zip(ids, keep) if kept]
+            versions = [version for version, kept in zip(versions, keep) if kept]
+
+        index = ProductIndex(matrix, products, ids, versions, normalized=True)
+        if "watermark" in vars(self):
+            # Carried forward rather than rescanning every version
+            seen = [self.watermark] + [doc.get(VERSION_FIELD) for doc in updates.values()]
+            seen.extend(doc.get(VERSION_FIELD) for doc in appended)
+            seen = [version for version in seen if version is not None]
+            index.watermark = max(seen) if seen else None
+        if self.ann is not None and len(index):
+            # Only the changed rows are re-indexed, not the whole catalog
+            updated = [row for row in updates if keep is None or keep[row]]
+            index.attach_ann(self.ann.refresh(index.matrix, updated, len(appended), keep), self.rerank)
+        return index
+
+    def search(self, query_embedding, top_k=5, filters=None):
+        """Return the top_k products for a query vector, best match first."""
+        return self.search_many([query_embedding], top_k, filters)[0]
+
+    def search_many(self, query_embeddings, top_k=5, filters=None, texts=None, mode="vector"):
+        """Return the top_k products for each row of a query matrix.
+
+        With `filters` (a ProductFilters) only matching rows are scored.
+        The "hybrid" and "lexical" modes also need the query `texts`.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if not len(self) or not len(queries):
+            return [[] for _ in range(len(queries))]
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        rows = self.columns.rows(filters) if filters is not None else None
+        if mode == "vector" or texts is None:
+            ids = self.vector_ids(queries, top_k, rows)
+        elif mode == "hybrid":
+            ids = self.search_hybrid(queries, texts, top_k, rows)
+        elif mode == "lexical":
+            ids = self.search_lexical(queries, texts, top_k, rows)
+        else:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+        return [[self.product(i) for i in row] for row in ids]
+
+    def product(self, row):
+        """Metadata of one row, with its catalog id as a stable reference."""
+        return dict(self.products[row], id=str(self.ids[row]))
+
+    def vector_ids(self, queries, top_k, rows=None):
+        if rows is None:
+            return self.search_ids(queries, top_k)
+        return self.search_rows(queries, rows, top_k)
+
+    def search_hybrid(self, queries, texts, top_k, rows=None):
+        """Fuse the vector and BM25 rankings with reciprocal-rank fusion."""
+        depth = max(top_k, HYBRID_DEPTH)
+        vector_rankings = self.vector_ids(queries, depth, rows)
+        return [
+            reciprocal_rank_fusion([vector_ranking, self.lexical.search(text, depth, rows)[0]], top_k)
+            for vector_ranking, text in zip(vector_rankings, texts)
+        ]
+
+    def search_lexical(self, queries, texts, top_k, rows=None):
+        """Re-rank a BM25 shortlist exactly by vector score.
+
+        Only the shortlist is scored; queries with fewer than top_k lexical
+        matches are topped up from a vector search.
+        """
+        results = []
+        short = []
+        for i, (query, text) in enumerate(zip(queries, texts)):
+            shortlist = np.sort(self.lexical.search(text, LEXICAL_SHORTLIST, rows)[0])
+            results.append(self.search_rows(query[np.newaxis, :], shortlist, top_k)[0])
+            if len(shortlist) < top_k:
+                short.append(i)
+        if short:
+            for i, ids in zip(short, self.vector_ids(queries[short], top_k, rows)):
+                seen = set(results[i].tolist())
+                extra = [row for row in ids if row not in seen]
+                results[i] = np.concatenate([results[i], np.asarray(extra, dtype=np.int64)])[:top_k]
+        return results
+
+    def search_rows(self, queries, rows, top_k=5):
+        """Exact top_k over a subset of rows, returned as catalog row ids.
+
+        Filtered searches bypass the ANN backend: the candidate set is
+        already narrowed, so scoring it exactly is both cheaper and exact.
+        Broad filters score the whole matrix and mask out the other rows;
+        narrow ones gather the selected rows a bounded block at a time.
+        """
+        if not len(rows):
+            return [np.zeros(0, dtype=np.int64) for _ in range(len(queries))]
+        if len(rows) >= FILTER_MASK_SHARE * len(self):
+            excluded = np.ones(len(self), dtype=bool)
+            excluded[rows] = False
+            return exact_top_k(queries, self.matrix, min(top_k, len(rows)), excluded)
+        return subset_top_k(queries, self.matrix, rows, top_k)
+
+    def search_ids(self, queries, top_k=5):
+        """Return row ids of the top_k matches for each normalized query."""
+        if self.ann is None:
+            return exact_top_k(queries, self.matrix, top_k)
+
+        if not self.rerank:
+            return self.ann.search(queries, top_k)
+
+        shortlists = self.ann.search(queries, top_k * self.rerank)
+        results = []
+        for query, shortlist in zip(queries, shortlists):
+            scores = self.matrix[shortlist] @ query
+            results.append(shortlist[top_k_rows(scores[np.newaxis, :], top_k)[0]])
+        return results
+
+
+def exact_top_k(queries, matrix, top_k, excluded=None):
+    """Brute-force top_k, scored in row blocks so large query batches keep the score matrix bounded.
+
+    Rows flagged in the boolean `excluded` mask are never returned.
+    """
+    block = max(1, SCORE_BLOCK_ELEMENTS // max(1, len(matrix)))
+    results = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ matrix.T
+        if excluded is not None:
+            scores[:, excluded] = -np.inf
+        results.extend(top_k_rows(scores, top_k))
+    return results
+
+
+def subset_top_k(queries, matrix, rows, top_k):
+    """Exact top_k over `rows` of the matrix, returned as matrix rows.
+
+    Rows are gathered and scored in blocks, keeping a running top_k per
+    query, so neither the copied rows nor the scores exceed the block budget.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    block = max(top_k, SCORE_BLOCK_ELEMENTS // max(len(queries), matrix.shape[1], 1))
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(rows), block):
+        chunk = rows[start:start + block]
+        scores = np.hstack([best_scores, queries @ matrix[chunk].T])
+        candidates = np.hstack([best_rows, np.broadcast_to(chunk, (len(queries), len(chunk)))])
+        top = top_k_rows(scores, top_k)
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(candidates, top, axis=1)
+    return list(best_rows)
+
+
+def document_projection():
+    projection = {"_id": 1, "embedding": 1, VERSION_FIELD: 1}
+    projection.update({field: 1 for field in PRODUCT_FIELDS})
+    return projection
+
+
+def configure_ann(index):
+    """Attach the ANN backend selected by ANN_BACKEND, loading it from ANN_INDEX_PATH if saved."""
+    name = os.getenv("ANN_BACKEND", "exact")
+    if name == "exact" or not len(index):
+        return index
+
+    params = backend_params_from_env()
+    path = os.getenv("ANN_INDEX_PATH")
+    backend = load_backend(path, index.matrix, **params) if path else None
+    if backend is None:
+        backend = get_backend(name, **params).build(index.matrix)
+        if path:
+            save_backend(backend, path, index.matrix)
+    index.attach_ann(backend, rerank=int(os.getenv("ANN_RERANK", 0)))
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_product_index(collection, snapshot_dir=None):
+    """Return the process-wide product index, building it on first use.
+
+    With `snapshot_dir` the index is mapped from the current on-disk
+    snapshot instead of being read from Mongo.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if snapshot_dir:
+                    from .snapshot import load_snapshot
+                    index = load_snapshot(
+                        snapshot_dir, rerank=int(os.getenv("ANN_RERANK", 0)), **backend_params_from_env()
+                    )
+                else:
+                    index = configure_ann(ProductIndex.from_collection(collection))
+                print(f"Product index built with {len(index)} products")
+                if not len(index):
+                    # Don't pin an empty catalog; retry on the next request
+                    return index
+                # Computed once here (snapshots read it from their manifest)
+                index.catalog_version
+                _index = index
+    return _index
+
+
+def swap_product_index(index):
+    """Atomically replace the process-wide index; in-flight requests keep the old one."""
+    global _index
+    warm_derived(index, _index)
+    with _index_lock:
+        _index = index
+
+
+# Lazily built side structures of an index, cheapest first
+DERIVED = ("catalog_version", "positions", "columns", "lexical")
+
+
+def warm_derived(index, previous=None):
+    """Build an index's side structures before it goes live.
+
+    Swaps happen on background threads (sync, snapshot watcher), so the
+    first request after a swap must not pay for them. The version and id
+    map are always built; filter columns and BM25 only if the index being
+    replaced had needed them. Snapshots load theirs from disk instead.
+    """
+    for name in DERIVED:
+        if name in ("catalog_version", "positions") or previous is None or name in vars(previous):
+            getattr(index, name)
+
+
+def current_product_index():
+    """Return the process-wide index without building it."""
+    return _index
+
+
+def reset_product_index():
+    """Drop the cached index so the next request rebuilds it."""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,133 @@
+import math
+import re
+from fractions import Fraction
+
+# Recipes are fetched from the LLM once at this size and rescaled locally
+CANONICAL_SERVINGS = 4
+
+UNICODE_FRACTIONS = {
+    "¼": "1/4", "½": "1/2", "¾": "3/4", "⅓": "1/3", "⅔": "2/3",
+    "⅛": "1/8", "⅜": "3/8", "⅝": "5/8", "⅞": "7/8",
+}
+
+# singular -> plural for units we know how to inflect
+UNIT_FORMS = {
+    "cup": "cups", "tablespoon": "tablespoons", "teaspoon": "teaspoons",
+    "pound": "pounds", "ounce": "ounces", "gram": "grams", "kilogram": "kilograms",
+    "liter": "liters", "milliliter": "milliliters", "quart": "quarts", "pint": "pints",
+    "clove": "cloves", "can": "cans", "head": "heads", "bunch": "bunches",
+    "fillet": "fillets", "piece": "pieces", "slice": "slices", "package": "packages",
+    "stalk": "stalks", "sprig": "sprigs", "egg": "eggs", "jar": "jars",
+    "bottle": "bottles", "box": "boxes", "bag": "bags", "leaf": "leaves",
+}
+PLURAL_UNITS = {plural: singular for singular, plural in UNIT_FORMS.items()}
+
+# Units (and egg sizes) that only make sense as whole numbers
+COUNT_UNITS = {
+    "clove", "can", "head", "bunch", "fillet", "piece", "slice", "package",
+    "stalk", "sprig", "egg", "jar", "bottle", "box", "bag", "leaf",
+    "large", "medium", "small", "whole", "each",
+}
+COUNT_INGREDIENTS = re.compile(r"\b(eggs?|lemons?|limes?|onions?|avocados?|bananas?)\b")
+
+# Smallest practical step when rounding a scaled quantity, per unit
+ROUNDING_STEPS = {
+    "cup": Fraction(1, 4), "tablespoon": Fraction(1, 2), "teaspoon": Fraction(1, 4),
+    "pound": Fraction(1, 4), "ounce": Fraction(1), "gram": Fraction(5),
+    "kilogram": Fraction(1, 4), "milliliter": Fraction(5), "liter": Fraction(1, 4),
+}
+DEFAULT_STEP = Fraction(1, 4)
+
+NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+"
+QUANTITY_RE = re.compile(rf"^\s*({NUMBER})(?:\s*(?:-|to)\s*({NUMBER}))?\s*$")
+
+
+def canonical_unit(unit):
+    unit = (unit or "").strip().lower()
+    return PLURAL_UNITS.get(unit, unit)
+
+
+def parse_number(text):
+    """Parse '2', '0.5', '1/4' or '1 1/2' into a Fraction."""
+    text = text.strip()
+    if " " in text:
+        whole, frac = text.split(None, 1)
+        return Fraction(whole) + Fraction(frac)
+    return Fraction(text)
+
+
+def parse_quantity(quantity):
+    """Parse a quantity string into (low, high) Fractions, or None if it isn't numeric."""
+    if quantity is None:
+        return None
+    text = str(quantity)
+    for symbol, replacement in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f" {replacement}")
+    match = QUANTITY_RE.match(text)
+    if not match:
+        return None
+    try:
+        low = parse_number(match.group(1))
+        high = parse_number(match.group(2)) if match.group(2) else low
+    except (ValueError, ZeroDivisionError):
+        return None
+    return low, high
+
+
+def round_quantity(value, unit, name=""):
+    """Round a scaled quantity to something you can actually measure or buy."""
+    unit = canonical_unit(unit)
+    if unit in COUNT_UNITS or (not unit and COUNT_INGREDIENTS.search(name.lower())):
+        return Fraction(max(1, math.floor(value + Fraction(1, 2))))
+
+    step = ROUNDING_STEPS.get(unit, DEFAULT_STEP)
+    rounded = Fraction(math.floor(value / step + Fraction(1, 2))) * step
+    return rounded if rounded > 0 else step
+
+
+def format_quantity(value):
+    """Format a Fraction as '2', '3/4' or '1 1/2'."""
+    whole = value.numerator // value.denominator
+    remainder = value - whole
+    if not remainder:
+        return str(whole)
+    if not whole:
+        return f"{remainder.numerator}/{remainder.denominator}"
+    return f"{whole} {remainder.numerator}/{remainder.denominator}"
+
+
+def inflect_unit(unit, value):
+    """Match a known unit's singular/plural form to the new quantity."""
+    if not unit:
+        return unit
+    singular = canonical_unit(unit)
+    if singular not in UNIT_FORMS:
+        return unit
+    return UNIT_FORMS[singular] if value > 1 else singular
+
+
+def scale_ingredient(ingredient, factor):
+    """Return a copy of a parsed ingredient with its quantity scaled by factor."""
+    scaled = dict(ingredient)
+    parsed = parse_quantity(ingredient.get("quantity"))
+    if parsed is None or factor == 1:
+        return scaled
+
+    unit = ingredient.get("unit")
+    low, high = (round_quantity(value * factor, unit, ingredient.get("name", "")) for value in parsed)
+    if low == high:
+        scaled["quantity"] = format_quantity(low)
+    else:
+        scaled["quantity"] = f"{format_quantity(low)}-{format_quantity(high)}"
+    scaled["unit"] = inflect_unit(unit, high)
+    return scaled
+
+
+def servings_factor(from_servings, to_servings):
+    return Fraction(to_servings, from_servings)
+
+
+def scale_ingredients(ingredients, from_servings, to_servings):
+    """Rescale a parsed ingredient list from one serving count to another."""
+    factor = servings_factor(from_servings, to_servings)
+    return [scale_ingredient(ingredient, factor) for ingredient in ingredients]
@@ -0,0 +1,29 @@
+class RecordParser:
+    """Incrementally split a streamed completion into delimiter-separated records.
+
+    `feed` returns the records completed by a chunk; the trailing partial
+    record stays buffered until its delimiter arrives or `close` is called.
+    """
+
+    def __init__(self, delimiter=","):
+        self.delimiter = delimiter
+        self.buffer = ""
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        *complete, self.buffer = self.buffer.split(self.delimiter)
+        return [record.strip() for record in complete if record.strip()]
+
+    def close(self):
+        record, self.buffer = self.buffer.strip(), ""
+        return [record] if record else []
+
+
+async def astream_records(chain, inputs, delimiter=","):
+    """Yield each complete record from `chain.astream` while the model is still generating."""
+    parser = RecordParser(delimiter)
+    async for chunk in chain.astream(inputs):
+        for record in parser.feed(chunk):
+            yield record
+    for record in parser.close():
+        yield record
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+current_trace = ContextVar("current_trace", default=None)
+
+# Column limits of api.models.Request; strict backends reject the whole
+# batch insert over a single out-of-range row
+MODE_MAX_LENGTH = 16
+RECIPE_NAME_MAX_LENGTH = 200
+SMALL_INT_MAX = 32767
+
+
+class RequestTrace:
+    """What one request asked for, what it resolved to and where its time went."""
+
+    def __init__(self, mode="shopping", text="", recipe_name="", servings=None):
+        self.describe(mode, text, recipe_name, servings)
+        self.items = []
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def describe(self, mode="shopping", text="", recipe_name="", servings=None):
+        self.mode = mode
+        self.text = text
+        self.recipe_name = recipe_name
+        self.servings = servings
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing header value with the stages recorded so far, in milliseconds."""
+        entries = [f"{stage};dur={1000 * seconds:.1f}" for stage, seconds in self.timings.items()]
+        entries.append(f"total;dur={1000 * self.elapsed():.1f}")
+        return ", ".join(entries)
+
+    def fields(self, status):
+        timings = {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        timings["total"] = round(self.elapsed(), 4)
+        servings = self.servings if self.mode == "recipe" else None
+        return {
+            "text": self.text or None,
+            "mode": str(self.mode)[:MODE_MAX_LENGTH],
+            "recipe_name": str(self.recipe_name or "")[:RECIPE_NAME_MAX_LENGTH],
+            "servings": min(max(int(servings), 0), SMALL_INT_MAX) if servings is not None else None,
+            "items": self.items,
+            "timings": timings,
+            "status": min(max(int(status), 0), SMALL_INT_MAX),
+        }
+
+
+def start_trace(**kwargs):
+    """Describe the request being traced, starting a trace if the middleware has not.
+
+    Stages that run in this context (and in tasks or threads started from
+    it) report to the returned trace.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        trace = RequestTrace(**kwargs)
+        current_trace.set(trace)
+    else:
+        trace.describe(**kwargs)
+    return trace
+
+
+def record_stage(stage, seconds):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def record_items(items):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.items = list(items)
+
+
+def item_term(item):
+    """Search term of a logged item: recipe items are ingredient objects, shopping items are names."""
+    if isinstance(item, dict):
+        return item.get("search_term") or item.get("name")
+    return item
+
+
+class RequestLogger:
+    """Write-behind log of requests into the Request table.
+
+    `log` only enqueues, so it never waits on the database. A daemon thread
+    drains the queue and writes everything pending with one bulk_create,
+    at most every `flush_interval` seconds or as soon as `batch_size` rows
+    are waiting. When the queue is full, new entries are dropped and counted
+    rather than slowing requests down.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+        self._thread.start()
+
+    def log(self, trace, status=200):
+        if trace is None:
+            return
+        try:
+            self._queue.put_nowait(trace.fields(status))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        from django.db import close_old_connections
+        from .models import Request
+        try:
+            Request.objects.bulk_create([Request(**fields) for fields in batch])
+            self.written += len(batch)
+        except Exception as e:
+            # One bad row fails the whole batch; retry row by row so only it is lost
+            print(f"Request log batch write failed ({e}), writing rows one at a time")
+            for fields in batch:
+                try:
+                    Request.objects.create(**fields)
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Request log write failed: {e}")
+        finally:
+            close_old_connections()
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written (for commands and tests)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from . import db
+
+load_dotenv()
+
+
+class ResourceRegistry:
+    """Lazily built, process-wide heavy resources with load timings.
+
+    Nothing is constructed at import time. `warm_up` builds resources ahead
+    of the first request; in a gunicorn `--preload` master it builds only
+    the fork-safe ones (model weights, mapped catalog) so forked workers
+    share them copy-on-write, and `after_fork` drops anything holding
+    sockets, threads or SQLite handles so each worker opens its own.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._fork_safe = {}
+        self._values = {}
+        self._timings = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, fork_safe=True):
+        self._factories[name] = factory
+        self._fork_safe[name] = fork_safe
+
+    def get(self, name):
+        if name in self._values:
+            return self._values[name]
+        with self._lock:
+            if name not in self._values:
+                started = time.perf_counter()
+                self._values[name] = self._factories[name]()
+                self.record(name, time.perf_counter() - started)
+        return self._values[name]
+
+    def record(self, name, seconds):
+        self._timings[name] = seconds
+
+    def is_loaded(self, name):
+        return name in self._values
+
+    def warm_up(self, fork_safe_only=False):
+        """Build every registered resource now and return the startup report."""
+        for name, fork_safe in self._fork_safe.items():
+            if fork_safe or not fork_safe_only:
+                self.get(name)
+        return self.report()
+
+    def after_fork(self):
+        """Forget resources that must not be shared with a forked child."""
+        with self._lock:
+            for name, fork_safe in self._fork_safe.items():
+                if not fork_safe:
+                    self._values.pop(name, None)
+        db.reset_client()
+
+    def status(self):
+        """Whether each registered resource has been built in this process."""
+        return {name: name in self._values for name in self._factories}
+
+    def report(self):
+        """Seconds spent building each resource, in load order."""
+        return {
+            name: {"loaded": name in self._values or name not in self._factories, "seconds": round(seconds, 4)}
+            for name, seconds in self._timings.items()
+        }
+
+
+registry = ResourceRegistry()
+
+
+def load_encoder():
+    # ENCODER_BACKEND=onnx swaps in the int8 ONNX export behind the same encode() call
+    from .encoders import load_encoder_from_env
+    return load_encoder_from_env()
+
+
+def load_embedding_cache():
+    from .embedding_cache import EmbeddingCache
+    # Query embeddings are cached per worker; set EMBEDDING_CACHE_PATH to share
+    # warm entries between workers through a local SQLite file
+    return EmbeddingCache(
+        registry.get("encoder"),
+        max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 10000)),
+        shared_path=os.getenv("EMBEDDING_CACHE_PATH")
+    )
+
+
+def load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash-001",
+        google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+
+def load_llm_cache():
+    from .cache import SQLiteCache
+    # LLM responses are cached on disk so repeated lists and recipes skip Gemini;
+    # the SQLite file is shared by every worker and survives restarts
+    path = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "llm_cache.sqlite3"))
+    if not path:
+        return None
+    return SQLiteCache(
+        path,
+        table="llm_responses",
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", 10000)),
+        ttl=int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+    )
+
+
+def load_chain():
+    from .chain import get_chain
+    return get_chain(llm=registry.get("llm"), cache=registry.get("llm_cache"))
+
+
+def load_recipe_chain():
+    from .chain import get_chain_recipe
+    return get_chain_recipe(llm=registry.get("llm"), cache=registry.get("llm_cache"))
+
+
+def load_taxonomy():
+    from .taxonomy import Taxonomy
+    return Taxonomy.from_file(os.getenv("TAXONOMY_PATH") or None)
+
+
+def load_ocr_cache():
+    from .cache import SQLiteCache
+    # Extracted text is keyed by image hash, so re-uploaded photos skip Mistral
+    path = os.getenv("OCR_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "ocr_cache.sqlite3"))
+    if not path:
+        return None
+    return SQLiteCache(
+        path,
+        table="ocr_text",
+        max_entries=int(os.getenv("OCR_CACHE_SIZE", 5000)),
+        ttl=int(os.getenv("OCR_CACHE_TTL", 30 * 24 * 3600))
+    )
+
+
+def load_ocr():
+    from mistralai import Mistral
+    from .ocr import OCRService
+    # One client per worker so its HTTP connection pool is reused across uploads;
+    # MISTRAL_SERVER_URL points it at another endpoint (e.g. scripts/ocr_stub_server.py)
+    client = Mistral(
+        api_key=os.getenv("MISTRAL_API_KEY"),
+        server_url=os.getenv("MISTRAL_SERVER_URL") or None
+    )
+    return OCRService(
+        client,
+        cache=registry.get("ocr_cache"),
+        match_visual=os.getenv("OCR_PERCEPTUAL_CACHE", "").lower() in ("1", "true", "yes")
+    )
+
+
+def load_term_table():
+    from .term_table import TermTableStore
+    # Top-k ids precomputed by `manage.py build_term_table`; used only while
+    # its catalog version matches the live index
+    return TermTableStore.from_path(
+        os.getenv("TERM_TABLE_PATH"),
+        encode=registry.get("embedding_cache").encode,
+        rebuild=os.getenv("TERM_TABLE_REBUILD", "").lower() in ("1", "true", "yes")
+    )
+
+
+def load_request_log():
+    from .request_log import RequestLogger
+    # Requests are written to the Request table in the background (REQUEST_LOG=0 disables)
+    if os.getenv("REQUEST_LOG", "1").lower() in ("0", "false", "no"):
+        return None
+    return RequestLogger(
+        batch_size=int(os.getenv("REQUEST_LOG_BATCH", 200)),
+        flush_interval=float(os.getenv("REQUEST_LOG_FLUSH_INTERVAL", 2))
+    )
+
+
+def load_cpu_executor():
+    # CPU-bound encoding and scoring run here so they never block the event loop
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("CPU_WORKERS", 2)),
+        thread_name_prefix="curator-cpu"
+    )
+
+
+# onnxruntime sessions (and their thread pools) don't survive a fork, so
+# the ONNX encoder is built in each worker instead of the preload master
+registry.register("encoder", load_encoder, fork_safe=os.getenv("ENCODER_BACKEND", "sentence-transformers") != "onnx")
+registry.register("embedding_cache", load_embedding_cache, fork_safe=False)
+registry.register("llm", load_llm, fork_safe=False)
+registry.register("llm_cache", load_llm_cache, fork_safe=False)
+registry.register("chain", load_chain, fork_safe=False)
+registry.register("recipe_chain", load_recipe_chain, fork_safe=False)
+registry.register("taxonomy", load_taxonomy)
+registry.register("ocr_cache", load_ocr_cache, fork_safe=False)
+registry.register("ocr", load_ocr, fork_safe=False)
+registry.register("term_table", load_term_table, fork_safe=False)
+registry.register("request_log", load_request_log, fork_safe=False)
+registry.register("cpu_executor", load_cpu_executor, fork_safe=False)
@@ -0,0 +1,79 @@
+import json
+import time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from .product_index import PRODUCT_FIELDS
+from .request_log import record_stage
+
+try:
+    import orjson
+except ImportError:  # optional dependency, falls back to the standard json module
+    orjson = None
+
+_django_default = DjangoJSONEncoder().default
+
+
+def dumps(data):
+    """Serialize to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_django_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+class FastJsonResponse(JsonResponse):
+    """JsonResponse that encodes with orjson when available."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        started = time.perf_counter()
+        if orjson is None:
+            super().__init__(data, safe=safe, **kwargs)
+        else:
+            if safe and not isinstance(data, dict):
+                raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+            kwargs.setdefault("content_type", "application/json")
+            HttpResponse.__init__(self, content=dumps(data), **kwargs)
+        record_stage("json", time.perf_counter() - started)
+
+
+class ProductTable:
+    """Products referenced by id, so each product is serialized once per response."""
+
+    def __init__(self):
+        self.products = {}
+
+    def add(self, product):
+        product_id = product.get("id")
+        if product_id is None:
+            product_id = str(len(self.products))
+        if product_id not in self.products:
+            self.products[product_id] = {field: product[field] for field in PRODUCT_FIELDS if field in product}
+        return product_id
+
+    def refs(self, recommendations):
+        return [self.add(product) for product in recommendations]
+
+
+def compact_shopping_items(items, table):
+    """Shopping items with product ids in place of product objects."""
+    return [{"name": item["name"], "products": table.refs(item["recommendations"])} for item in items]
+
+
+def compact_recipe_items(items, table):
+    """Recipe items grouped by category, with product ids in place of product objects.
+
+    Quantity and unit sit on the ingredient once instead of being copied
+    into every recommendation.
+    """
+    categories = {}
+    for item in items:
+        categories.setdefault(item["category"], []).append({
+            "name": item["name"],
+            "quantity": item["quantity"],
+            "unit": item["unit"],
+            "products": table.refs(item["recommendations"])
+        })
+    return [{"name": name, "items": entries} for name, entries in categories.items()]
+
+
+def wants_compact(value):
+    return str(value or "").lower() == "compact"
@@ -0,0 +1,289 @@
+import datetime
+import json
+import mmap
+import os
+import shutil
+import threading
+import numpy as np
+from .ann import load_backend, save_backend, matrix_fingerprint
+from .filters import ProductColumns
+from .lexical import BM25Index
+from .product_index import ProductIndex, swap_product_index
+
+# On-disk layout under the snapshot root:
+#   CURRENT                  name of the live version, replaced atomically
+#   <version>/embeddings.npy normalized float32 matrix, opened with mmap
+#   <version>/metadata.bin   concatenated UTF-8 JSON records, one per row
+#   <version>/offsets.npy    int64 byte offsets into metadata.bin (rows + 1)
+#   <version>/ids.npy        product id of each row, opened with mmap
+#   <version>/id_order.npy   row order that sorts ids.npy, for id lookups
+#   <version>/manifest.json  row count, dimension, fingerprint, catalog version and watermark
+#   <version>/ann.idx        optional prebuilt ANN index
+CURRENT_FILE = "CURRENT"
+
+
+class SnapshotRecords:
+    """Read-only sequence over the metadata records of a snapshot.
+
+    Records are decoded from the shared page cache on access, so a worker
+    never holds its own copy of the whole metadata table.
+    """
+
+    def __init__(self, buffer, offsets, field=None):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.field = field
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def record(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.buffer[start:end])
+
+    def column(self, field):
+        return SnapshotRecords(self.buffer, self.offsets, field)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+
+        record = self.record(row)
+        if self.field == "_id":
+            return record["_id"]
+        if self.field == "updated_at":
+            return decode_version(record.get("updated_at"))
+        record.pop("_id", None)
+        record.pop("updated_at", None)
+        return record
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class SnapshotPositions:
+    """Product id -> row lookups by binary search over the snapshot's id arrays.
+
+    Stands in for ProductIndex.positions, so workers share the mapped id
+    arrays instead of each building a dict of every id.
+    """
+
+    def __init__(self, ids, order):
+        self.ids = ids
+        self.order = order
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, product_id, default=None):
+        if not len(self.ids):
+            return default
+        key = str(product_id)
+        i = int(np.searchsorted(self.ids, key, sorter=self.order))
+        if i < len(self.order):
+            row = int(self.order[i])
+            if self.ids[row] == key:
+                return row
+        return default
+
+    def __contains__(self, product_id):
+        return self.get(product_id) is not None
+
+    def __getitem__(self, product_id):
+        row = self.get(product_id)
+        if row is None:
+            raise KeyError(product_id)
+        return row
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield str(self.ids[row])
+
+    def items(self):
+        for row in range(len(self.ids)):
+            yield str(self.ids[row]), row
+
+
+def encode_version(version):
+    """`updated_at` as stored in records and the manifest."""
+    return version.isoformat() if hasattr(version, "isoformat") else version
+
+
+def decode_version(version):
+    return datetime.datetime.fromisoformat(version) if isinstance(version, str) else version
+
+
+def new_version():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("v%Y%m%d%H%M%S%f")
+
+
+def read_current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_snapshot(index, root, ann_backend=None, keep=3):
+    """Write index to a new snapshot version under root and make it current."""
+    os.makedirs(root, exist_ok=True)
+    version = new_version()
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+
+    np.save(os.path.join(staging, "embeddings.npy"), np.ascontiguousarray(index.matrix, dtype=np.float32))
+
+    offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    with open(os.path.join(staging, "metadata.bin"), "wb") as f:
+        position = 0
+        for row, (product, product_id, product_version) in enumerate(zip(index.products, index.ids, index.versions)):
+            record = dict(product, _id=product_id)
+            if product_version is not None:
+                record["updated_at"] = encode_version(product_version)
+            data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            f.write(data)
+            position += len(data)
+            offsets[row + 1] = position
+    np.save(os.path.join(staging, "offsets.npy"), offsets)
+
+    # Ids and the catalog version ship precomputed: deriving them means
+    # decoding every record, in every worker, after every swap
+    ids = np.array([str(product_id) for product_id in index.ids], dtype=str)
+    np.save(os.path.join(staging, "ids.npy"), ids)
+    np.save(os.path.join(staging, "id_order.npy"), np.argsort(ids, kind="stable").astype(np.int64))
+
+    # Filter columns and the BM25 index ship with the snapshot so workers
+    # never decode every record to build them
+    index.columns.save(os.path.join(staging, "columns.npz"))
+    index.lexical.save(os.path.join(staging, "lexical.npz"))
+
+    if ann_backend is not None:
+        save_backend(ann_backend, os.path.join(staging, "ann.idx"), index.matrix)
+
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "rows": len(index),
+            "dim": int(index.matrix.shape[1]) if len(index) else 0,
+            "fingerprint": matrix_fingerprint(index.matrix),
+            "catalog_version": index.catalog_version,
+            "watermark": encode_version(index.watermark),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }, f, indent=2)
+
+    # Publish: the version directory appears complete, then CURRENT flips to it
+    os.rename(staging, os.path.join(root, version))
+    pointer = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+    prune_snapshots(root, keep)
+    return version
+
+
+def prune_snapshots(root, keep=3):
+    """Delete all but the newest `keep` versions. Workers still mapping them keep their open files."""
+    current = read_current_version(root)
+    versions = sorted(name for name in os.listdir(root) if name.startswith("v") and name != current)
+    for name in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_snapshot(root, version=None, rerank=0, **ann_params):
+    """Open a snapshot version (the current one by default) as a ProductIndex backed by mmap."""
+    version = version or read_current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No snapshot published under {root}")
+    path = os.path.join(root, version)
+
+    matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+    with open(os.path.join(path, "metadata.bin"), "rb") as f:
+        # mmap refuses empty files
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    records = SnapshotRecords(buffer, offsets)
+    ids_path = os.path.join(path, "ids.npy")
+    # Snapshots written before ids.npy existed decode ids from the records
+    ids = np.load(ids_path, mmap_mode="r") if os.path.exists(ids_path) else records.column("_id")
+    index = ProductIndex(matrix, records, ids, records.column("updated_at"), normalized=True)
+    index.snapshot_version = version
+    if os.path.exists(ids_path):
+        index.positions = SnapshotPositions(ids, np.load(os.path.join(path, "id_order.npy"), mmap_mode="r"))
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("catalog_version"):
+        index.catalog_version = manifest["catalog_version"]
+    if "watermark" in manifest:
+        index.watermark = decode_version(manifest["watermark"])
+    columns_path = os.path.join(path, "columns.npz")
+    if os.path.exists(columns_path):
+        index.columns = ProductColumns.load(columns_path)
+    lexical_path = os.path.join(path, "lexical.npz")
+    if os.path.exists(lexical_path):
+        index.lexical = BM25Index.load(lexical_path)
+
+    ann_path = os.path.join(path, "ann.idx")
+    if len(index) and os.path.exists(ann_path):
+        backend = load_backend(ann_path, matrix, **ann_params)
+        if backend is not None:
+            index.attach_ann(backend, rerank)
+    return index
+
+
+class SnapshotWatcher:
+    """Swaps the process-wide index whenever a new snapshot version is published."""
+
+    def __init__(self, root, interval=10, version=None, **load_options):
+        self.root = root
+        self.interval = interval
+        self.load_options = load_options
+        self.version = version
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Snapshot reload failed: {e}")
+
+    def check(self):
+        """Load and swap in the current snapshot if it changed; returns True on swap."""
+        version = read_current_version(self.root)
+        if version is None or version == self.version:
+            return False
+        swap_product_index(load_snapshot(self.root, version, **self.load_options))
+        self.version = version
+        print(f"Switched to product snapshot {version}")
+        return True
+
+
+_watcher = None
+
+
+def start_snapshot_watcher(root, interval, version=None, **load_options):
+    """Start the background watcher once per process."""
+    global _watcher
+    if _watcher is None and interval > 0:
+        _watcher = SnapshotWatcher(root, interval, version, **load_options).start()
+    return _watcher
@@ -0,0 +1,55 @@
+import time
+from django.http import StreamingHttpResponse
+from .request_log import record_stage
+from .responses import dumps
+
+STREAM_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "text/event-stream": "sse",
+}
+
+
+def negotiate_stream(request):
+    """Return 'ndjson' or 'sse' if the client asked for a streamed response, else None."""
+    accept = request.headers.get("Accept", "")
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in STREAM_TYPES:
+            return STREAM_TYPES[media_type]
+    return None
+
+
+def encode_event(record, stream_format):
+    """Serialize one record as an NDJSON line or a server-sent event."""
+    started = time.perf_counter()
+    data = dumps(record).decode("utf-8")
+    record_stage("json", time.perf_counter() - started)
+    if stream_format == "sse":
+        return f"event: {record.get('type', 'message')}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def growing_batches(first=1, largest=16):
+    """Yield batch sizes 1, 2, 4, ... capped at largest.
+
+    The first record goes out after scoring a single item, later batches
+    grow to keep the per-batch overhead small.
+    """
+    size = first
+    while True:
+        yield size
+        size = min(size * 2, largest)
+
+
+def streaming_response(records, stream_format):
+    """Wrap an async iterator of records in a StreamingHttpResponse."""
+    async def body():
+        async for record in records:
+            yield encode_event(record, stream_format)
+
+    content_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    response = StreamingHttpResponse(body(), content_type=content_type)
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import threading
+import numpy as np
+from .product_index import normalize_rows
+
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "taxonomy.json")
+
+
+class Taxonomy:
+    """Ingredient categories compiled into a single word-boundary regex.
+
+    Every term of every category goes into one alternation, longest terms
+    first, so "peanut butter" beats "butter" and "bell pepper" beats
+    "pepper". When a name contains several terms the longest wins, ties
+    going to the rightmost one (the head noun in "garlic butter").
+
+    Names with no matching term fall back to the nearest category centroid:
+    the mean embedding of that category's terms, built on first use.
+    """
+
+    def __init__(self, categories, default="Other Ingredients", min_similarity=0.35):
+        self.default = default
+        self.min_similarity = min_similarity
+        self.names = list(categories)
+        self.terms = {}
+        for category, terms in categories.items():
+            for term in terms:
+                self.terms.setdefault(" ".join(term.lower().split()), category)
+
+        alternation = "|".join(re.escape(term) for term in sorted(self.terms, key=len, reverse=True))
+        self.pattern = re.compile(rf"\b({alternation})(?:e?s)?\b")
+        self.categories = categories
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or DEFAULT_TAXONOMY_PATH, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(
+            config["categories"],
+            default=config.get("default", "Other Ingredients"),
+            min_similarity=config.get("min_similarity", 0.35)
+        )
+
+    def match(self, name):
+        """Category of the best matching term in name, or None."""
+        best = None
+        for found in self.pattern.finditer(" ".join(str(name).lower().split())):
+            term = found.group(1)
+            if best is None or len(term) >= len(best):
+                best = term
+        return self.terms[best] if best else None
+
+    def centroids(self, encode):
+        """Unit-length mean embedding per category, encoded once."""
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    rows = []
+                    for category in self.names:
+                        vectors = normalize_rows(encode(self.categories[category]))
+                        rows.append(vectors.mean(axis=0))
+                    self._centroids = normalize_rows(np.stack(rows))
+        return self._centroids
+
+    def categorize_many(self, names, embeddings=None, encode=None):
+        """Categorize a whole ingredient list in one pass.
+
+        `embeddings` may hold one query vector per name (as already computed
+        for retrieval, None where there is none) so the centroid fallback does
+        not encode again; `encode` is only needed for the centroids and for
+        names without a vector. Without `encode`, unmatched names get the
+        default category.
+        """
+        result = [self.match(name) for name in names]
+        unmatched = [i for i, category in enumerate(result) if category is None]
+        if unmatched and encode is not None:
+            vectors = [None if embeddings is None else embeddings[i] for i in unmatched]
+            missing = [j for j, vector in enumerate(vectors) if vector is None]
+            if missing:
+                for j, vector in zip(missing, encode([names[unmatched[j]] for j in missing])):
+                    vectors[j] = vector
+            scores = normalize_rows(np.stack(vectors)) @ self.centroids(encode).T
+            best = np.argmax(scores, axis=1)
+            for i, row, score in zip(unmatched, best, scores[np.arange(len(best)), best]):
+                if score >= self.min_similarity:
+                    result[i] = self.names[row]
+        return [category or self.default for category in result]
+
+    def categorize(self, name, encode=None):
+        return self.categorize_many([name], encode=encode)[0]
@@ -0,0 +1,144 @@
+import os
+import threading
+import numpy as np
+from .embedding_cache import normalize_term
+
+
+class TermTable:
+    """Precomputed top-k product ids for a fixed vocabulary of search terms.
+
+    A table is built offline against one catalog version and retrieval
+    mode. Lookups resolve the stored ids through the live index, so price
+    and name edits show up immediately; any change to the catalog's
+    vectors or membership changes its version and the table stops being
+    used until it is rebuilt.
+    """
+
+    def __init__(self, terms, ids, catalog_version, mode="vector"):
+        self.terms = list(terms)
+        self.ids = ids
+        self.catalog_version = catalog_version
+        self.mode = mode
+        self.k = ids.shape[1] if ids.ndim == 2 else 0
+        self.rows = {term: row for row, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.terms)
+
+    @classmethod
+    def build(cls, index, terms, encode, k=10, mode="vector", batch_size=512):
+        """Encode `terms` in batches and store the k best product ids of each."""
+        terms = list(dict.fromkeys(normalize_term(term) for term in terms if str(term).strip()))
+        ids = np.full((len(terms), k), "", dtype=object)
+        for start in range(0, len(terms), batch_size):
+            batch = terms[start:start + batch_size]
+            results = index.search_many(encode(batch), k, texts=batch, mode=mode)
+            for row, products in enumerate(results, start):
+                for column, product in enumerate(products):
+                    ids[row, column] = product["id"]
+        return cls(terms, ids.astype(str), index.catalog_version, mode)
+
+    def save(self, path):
+        # Write then rename, so workers never load a half-written table
+        staging = f"{path}.tmp"
+        with open(staging, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(self.terms, dtype=str),
+                ids=self.ids,
+                catalog_version=self.catalog_version,
+                mode=self.mode,
+            )
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["terms"].tolist(), data["ids"], str(data["catalog_version"]), str(data["mode"]))
+
+    def matches(self, index, mode):
+        return self.mode == mode and self.catalog_version == index.catalog_version
+
+    def lookup(self, terms, index, top_k):
+        """Return term -> products for the terms in the table (at most top_k each)."""
+        if top_k > self.k:
+            return {}
+        found = {}
+        positions = index.positions
+        for term in terms:
+            row = self.rows.get(normalize_term(term))
+            if row is None:
+                continue
+            ids = [product_id for product_id in self.ids[row, :top_k].tolist() if product_id]
+            if all(product_id in positions for product_id in ids):
+                found[term] = [index.product(positions[product_id]) for product_id in ids]
+        return found
+
+
+class TermTableStore:
+    """The loaded term table of a worker, with hit counters and optional rebuild.
+
+    When the catalog version no longer matches, lookups miss. With
+    `rebuild`, a background thread then recomputes the table for the new
+    catalog from the same vocabulary and swaps it in.
+    """
+
+    def __init__(self, table, encode=None, rebuild=False, path=None):
+        self.table = table
+        self.encode = encode
+        self.rebuild = rebuild
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._rebuilding = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path, encode=None, rebuild=False):
+        if not path or not os.path.exists(path):
+            return None
+        table = TermTable.load(path)
+        print(f"Loaded term table with {len(table)} terms from {path}")
+        return cls(table, encode, rebuild, path)
+
+    def lookup(self, terms, index, top_k, mode):
+        table = self.table
+        if not table.matches(index, mode):
+            self.stale += len(terms)
+            self.start_rebuild(index, mode)
+            return {}
+        found = table.lookup(terms, index, top_k)
+        self.hits += len(found)
+        self.misses += len(terms) - len(found)
+        return found
+
+    def start_rebuild(self, index, mode):
+        if not self.rebuild or self.encode is None:
+            return
+        with self._lock:
+            if self._rebuilding == index.catalog_version:
+                return
+            self._rebuilding = index.catalog_version
+        threading.Thread(target=self._rebuild, args=(index, mode), name="term-table", daemon=True).start()
+
+    def _rebuild(self, index, mode):
+        try:
+            table = TermTable.build(index, self.table.terms, self.encode, self.table.k, mode)
+            self.table = table
+            print(f"Rebuilt term table with {len(table)} terms for catalog {table.catalog_version[:12]}")
+        except Exception as e:
+            print(f"Term table rebuild failed: {e}")
+            with self._lock:
+                self._rebuilding = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "terms": len(self.table),
+            "catalog_version": self.table.catalog_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,328 @@
+import asyncio
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+import mongomock
+import numpy as np
+from api import batch
+from api.fast_path import parse_plain_list
+from api.filters import ProductColumns, ProductFilters
+from api.index_sync import IndexSyncer
+from api.lexical import BM25Index, reciprocal_rank_fusion
+from api.product_index import ProductIndex, current_product_index, reset_product_index, swap_product_index
+from api.recipe_scaling import parse_quantity, scale_ingredients
+from api.snapshot import export_snapshot, load_snapshot
+from api.taxonomy import Taxonomy
+
+T0 = datetime.datetime(2024, 1, 1)
+
+
+def product(product_id, name, embedding, minutes=0):
+    return {
+        "_id": product_id,
+        "name": name,
+        "price": "1.00",
+        "category": "Pantry",
+        "embedding": embedding,
+        "updated_at": T0 + datetime.timedelta(minutes=minutes),
+    }
+
+
+class EmptyStream:
+    """Change stream that has seen no events."""
+
+    def try_next(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class StreamingCollection:
+    """mongomock collection that supports `watch`, like a replica set."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def watch(self, **kwargs):
+        return EmptyStream()
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+class IndexSyncTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.products
+        self.collection.insert_many([
+            product("a", "rice", [1.0, 0.0, 0.0]),
+            product("b", "pasta", [0.0, 1.0, 0.0]),
+        ])
+        swap_product_index(ProductIndex.from_collection(self.collection))
+
+    def tearDown(self):
+        reset_product_index()
+
+    def names(self):
+        index = current_product_index()
+        return {product_id: index.products[row]["name"] for product_id, row in index.positions.items()}
+
+    def test_insert_update_delete_through_polling(self):
+        # mongomock has no change streams, so the default syncer must fall back to polling
+        syncer = IndexSyncer(self.collection, id_scan_every=1)
+
+        self.collection.insert_one(product("c", "flour", [0.0, 0.0, 1.0], minutes=1))
+        self.assertEqual(syncer.sync_once(), 1)
+        self.assertFalse(syncer.use_change_streams)
+        self.assertEqual(self.names(), {"a": "rice", "b": "pasta", "c": "flour"})
+
+        self.collection.update_one({"_id": "a"}, {"$set": {
+            "name": "brown rice", "embedding": [0.0, 1.0, 1.0], "updated_at": T0 + datetime.timedelta(minutes=2),
+        }})
+        self.assertEqual(syncer.sync_once(), 1)
+        self.assertEqual(self.names()["a"], "brown rice")
+        index = current_product_index()
+        self.assertAlmostEqual(float(index.matrix[index.positions["a"]][1]), 2 ** -0.5, places=5)
+
+        self.collection.delete_one({"_id": "b"})
+        self.assertEqual(syncer.sync_once(), 1)
+        self.assertEqual(self.names(), {"a": "brown rice", "c": "flour"})
+
+        # Nothing left to apply
+        self.assertEqual(syncer.sync_once(), 0)
+
+    def test_stream_catches_up_on_writes_before_it_opened(self):
+        syncer = IndexSyncer(StreamingCollection(self.collection))
+
+        # Written after the index was built but before the first sync opens the stream
+        self.collection.insert_one(product("c", "flour", [0.0, 0.0, 1.0], minutes=1))
+        self.collection.delete_one({"_id": "b"})
+
+        self.assertEqual(syncer.sync_once(), 2)
+        self.assertTrue(syncer.use_change_streams)
+        self.assertEqual(self.names(), {"a": "rice", "c": "flour"})
+
+
+class RecipeScalingTests(unittest.TestCase):
+    def scaled(self, quantity, unit, name="flour", servings=8):
+        ingredient = {"name": name, "quantity": quantity, "unit": unit}
+        result = scale_ingredients([ingredient], 4, servings)[0]
+        return result["quantity"], result["unit"]
+
+    def test_parse_quantity(self):
+        self.assertEqual(parse_quantity("1 1/2"), (1.5, 1.5))
+        self.assertEqual(parse_quantity("½"), (0.5, 0.5))
+        self.assertEqual(parse_quantity("2-3"), (2, 3))
+        self.assertIsNone(parse_quantity("to taste"))
+
+    def test_scales_and_inflects_units(self):
+        self.assertEqual(self.scaled("1 1/2", "cups"), ("3", "cups"))
+        self.assertEqual(self.scaled("1", "cup"), ("2", "cups"))
+        self.assertEqual(self.scaled("2", "cups", servings=2), ("1", "cup"))
+        self.assertEqual(self.scaled("2-3", "tablespoons"), ("4-6", "tablespoons"))
+
+    def test_rounds_to_practical_amounts(self):
+        # 1/3 cup for 6 is 1/2 cup; eggs and cloves stay whole
+        self.assertEqual(self.scaled("1/3", "cup", servings=6), ("1/2", "cup"))
+        self.assertEqual(self.scaled("3", "", name="eggs", servings=2), ("2", ""))
+        self.assertEqual(self.scaled("1", "clove", servings=1), ("1", "clove"))
+
+    def test_non_numeric_quantities_are_left_alone(self):
+        self.assertEqual(self.scaled("to taste", "", name="salt"), ("to taste", ""))
+
+
+class FastPathTests(unittest.TestCase):
+    def test_plain_lists(self):
+        self.assertEqual(parse_plain_list("milk, eggs, bread"), ["milk", "eggs", "bread"])
+        self.assertEqual(parse_plain_list("- 2 lbs chicken\n- 1 cup rice"), ["chicken", "rice"])
+        self.assertEqual(parse_plain_list("MILK, EGGS, BREAD"), ["milk", "eggs", "bread"])
+
+    def test_receipts_drop_headers_prices_and_totals(self):
+        receipt = "WALMART SUPERCENTER\nSTORE #1234\nMILK 3.49\nEGGS 2.99\nSUBTOTAL 6.48\nTAX 0.52"
+        self.assertEqual(parse_plain_list(receipt), ["milk", "eggs"])
+        self.assertEqual(parse_plain_list("SAFEWAY\nBREAD 2.50\nBUTTER 4.00"), ["bread", "butter"])
+
+    def test_descriptive_or_short_requests_need_the_llm(self):
+        self.assertIsNone(parse_plain_list("things for a birthday party"))
+        self.assertIsNone(parse_plain_list("milk"))
+        self.assertIsNone(parse_plain_list("what goes in lasagna?"))
+
+    def test_unknown_single_words_need_the_llm(self):
+        self.assertIsNone(parse_plain_list("milk, bicycle", is_basic=lambda item: item == "milk"))
+        self.assertEqual(parse_plain_list("milk, mountain bike", is_basic=lambda item: item == "milk"),
+                         ["milk", "mountain bike"])
+
+
+# Toy embeddings: one axis per category, so centroids are the axes themselves
+VECTORS = {
+    "milk": [1.0, 0.0], "butter": [1.0, 0.1], "cheese": [0.9, 0.0],
+    "rice": [0.0, 1.0], "flour": [0.1, 1.0], "peanut butter": [0.0, 1.0],
+    "yogurt": [1.0, 0.2], "quinoa": [0.1, 0.9], "sponge": [0.7, -0.7],
+}
+
+
+class TaxonomyTests(unittest.TestCase):
+    def setUp(self):
+        self.taxonomy = Taxonomy(
+            {"Dairy": ["milk", "butter", "cheese"], "Pantry": ["rice", "flour", "peanut butter"]},
+            min_similarity=0.8,
+        )
+        self.encoded = []
+
+    def encode(self, terms):
+        self.encoded.extend(terms)
+        return np.array([VECTORS[term] for term in terms], dtype=np.float32)
+
+    def test_longest_term_wins_then_rightmost(self):
+        self.assertEqual(self.taxonomy.match("Creamy Peanut Butter"), "Pantry")
+        self.assertEqual(self.taxonomy.match("rice milk"), "Dairy")
+        self.assertEqual(self.taxonomy.match("cheeses"), "Dairy")
+        self.assertIsNone(self.taxonomy.match("sponge"))
+
+    def test_centroid_fallback(self):
+        categories = self.taxonomy.categorize_many(["yogurt", "quinoa", "sponge"], encode=self.encode)
+        self.assertEqual(categories, ["Dairy", "Pantry", "Other Ingredients"])
+
+    def test_fallback_reuses_given_vectors(self):
+        embeddings = [None, np.array(VECTORS["yogurt"])]
+        self.taxonomy.categorize_many(["milk", "yogurt"], embeddings, encode=self.encode)
+        # Only the category terms were encoded, for the centroids
+        self.assertNotIn("yogurt", self.encoded)
+
+    def test_without_encoder_unmatched_names_get_the_default(self):
+        self.assertEqual(self.taxonomy.categorize("quinoa"), "Other Ingredients")
+
+
+PRODUCTS = [
+    {"name": "Whole Milk", "brand": "Great Value", "price": "$3.48", "category": "Dairy"},
+    {"name": "Almond Milk", "brand": "Silk", "price": "$4.00", "category": "Dairy"},
+    {"name": "Cheddar Cheese", "brand": "Great Value", "price": "1,299.00", "category": "Dairy"},
+    {"name": "Jasmine Rice", "brand": "Mahatma", "price": "$2.10", "category": "Pantry"},
+    {"name": "Rice Cakes", "brand": "Quaker", "category": "Snacks"},
+]
+
+
+class FilterTests(unittest.TestCase):
+    def setUp(self):
+        self.columns = ProductColumns.from_products(PRODUCTS)
+
+    def rows(self, **filters):
+        return self.columns.rows(ProductFilters.from_request(filters)).tolist()
+
+    def test_from_request(self):
+        self.assertIsNone(ProductFilters.from_request({}))
+        filters = ProductFilters.from_request({"category": ["Dairy"], "brand": " Silk ", "max_price": "$5"})
+        self.assertEqual((filters.categories, filters.brands, filters.max_price), (["dairy"], ["silk"], 5.0))
+        with self.assertRaises(ValueError):
+            ProductFilters.from_request({"min_price": "cheap"})
+
+    def test_rows(self):
+        self.assertEqual(self.rows(category="dairy"), [0, 1, 2])
+        self.assertEqual(self.rows(category=["Dairy", "Pantry"], max_price=4), [0, 1, 3])
+        self.assertEqual(self.rows(brand="Great Value", min_price=100), [2])
+        self.assertEqual(self.rows(category="Frozen"), [])
+        # Products without a price never match a price range
+        self.assertEqual(self.rows(min_price=0), [0, 1, 2, 3])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = f"{root}/columns.npz"
+            self.columns.save(path)
+            loaded = ProductColumns.load(path)
+        filters = ProductFilters.from_request({"brand": "great value", "max_price": 5})
+        self.assertEqual(loaded.rows(filters).tolist(), self.columns.rows(filters).tolist())
+
+
+class LexicalTests(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25Index.from_products(PRODUCTS)
+
+    def test_search_ranks_and_restricts_rows(self):
+        rows, scores = self.index.search("rice", 10)
+        self.assertEqual(sorted(rows.tolist()), [3, 4])
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+        self.assertEqual(self.index.search("almond milks", 1)[0].tolist(), [1])
+        self.assertEqual(self.index.search("rice", 10, np.array([4]))[0].tolist(), [4])
+        self.assertEqual(len(self.index.search("bicycle", 10)[0]), 0)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = f"{root}/lexical.npz"
+            self.index.save(path)
+            loaded = BM25Index.load(path)
+        for got, expected in zip(loaded.search("great value milk", 5), self.index.search("great value milk", 5)):
+            np.testing.assert_array_equal(got, expected)
+
+    def test_reciprocal_rank_fusion(self):
+        # 2 is ranked well by both lists, so it beats each list's own winner
+        self.assertEqual(reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]], 3).tolist(), [2, 1, 4])
+        self.assertEqual(reciprocal_rank_fusion([[], []], 3).tolist(), [])
+
+
+class SnapshotTests(unittest.TestCase):
+    def test_round_trip(self):
+        docs = [
+            dict(product, _id=str(row), embedding=[float(row), 1.0, 0.5], updated_at=T0 + datetime.timedelta(minutes=row))
+            for row, product in enumerate(PRODUCTS)
+        ]
+        index = ProductIndex.from_documents(docs)
+        with tempfile.TemporaryDirectory() as root:
+            export_snapshot(index, root)
+            loaded = load_snapshot(root)
+
+            np.testing.assert_array_equal(loaded.matrix, index.matrix)
+            self.assertEqual(list(loaded.products), index.products)
+            self.assertEqual([str(product_id) for product_id in loaded.ids], index.ids)
+            self.assertEqual(loaded.positions["3"], 3)
+            self.assertNotIn("9", loaded.positions)
+            self.assertEqual(loaded.watermark, index.watermark)
+            self.assertEqual(loaded.known_catalog_version(), index.catalog_version)
+
+            query = np.array([2.0, 1.0, 0.5])
+            filters = ProductFilters.from_request({"category": "dairy"})
+            self.assertEqual(loaded.search(query, 3, filters), index.search(query, 3, filters))
+            self.assertEqual(
+                loaded.search_many([query], 3, texts=["rice"], mode="hybrid"),
+                index.search_many([query], 3, texts=["rice"], mode="hybrid"),
+            )
+
+
+class BatchTests(unittest.TestCase):
+    def test_identical_inputs_are_expanded_once(self):
+        jobs = [
+            batch.parse_job(0, {"items": "Milk,  eggs"}),
+            batch.parse_job(1, {"items": "milk, eggs"}),
+            batch.parse_job(2, {"mode": "recipe", "recipe_name": "Pancakes", "servings": 2}),
+            batch.parse_job(3, {"mode": "recipe", "recipe_name": "pancakes", "servings": 8}),
+        ]
+        expanded = []
+
+        async def expand_job(job):
+            expanded.append(job["id"])
+            return job["mode"], []
+
+        with mock.patch.object(batch, "expand_job", expand_job):
+            result = asyncio.run(batch.expand_unique(jobs))
+        self.assertEqual(len(result), 2)
+        self.assertEqual(expanded, [0, 2])
+
+    def test_each_distinct_term_is_scored_once(self):
+        expanded = {
+            ("shopping", "a"): ("shopping", ["milk", "eggs"]),
+            ("shopping", "b"): ("shopping", ["eggs", "flour"]),
+            ("recipe", "pancakes"): ("recipe", [{"search_term": "flour"}, {"search_term": "butter"}]),
+            ("shopping", "c"): ("error", "Processing failed"),
+        }
+        scored = []
+
+        def recommend_terms(terms, product_index, top_k, filters=None):
+            scored.extend(terms)
+            return [[term.upper()] for term in terms], [np.ones(2) for _ in terms]
+
+        with mock.patch.object(batch, "recommend_terms", recommend_terms), \
+                mock.patch.object(batch, "categorize_ingredients", lambda names, embeddings: ["Pantry"] * len(names)):
+            recommendations, categories = batch.score_terms(expanded, None, 5)
+        self.assertEqual(sorted(scored), ["butter", "eggs", "flour", "milk"])
+        self.assertEqual(recommendations["eggs"], ["EGGS"])
+        self.assertEqual(categories, {"flour": "Pantry", "butter": "Pantry"})
@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import index, get_recipe_ingredients
+from .views import index, get_recipe_ingredients, health_check, metrics
+from .batch import process_batch
 
 urlpatterns = [
     path("get-recipe-ingredients/", get_recipe_ingredients, name="get_recipe_ingredients"),
     path("process/", index, name="process"),
+    path("process/batch/", process_batch, name="process_batch"),
+    path("health/", health_check, name="health"),
+    path("metrics/", metrics, name="metrics"),
 ]
@@ -1,88 +1,199 @@
-from pymongo import MongoClient 
-from sentence_transformers import SentenceTransformer
-from langchain_google_genai import ChatGoogleGenerativeAI
-import numpy as np
+import asyncio
+import contextvars
 import os
 import json
+import time
+from functools import partial
+import pymongo
 from dotenv import load_dotenv
-from django.http import JsonResponse
+from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from .chain import get_chain, get_chain_recipe
-from mistral_ocr_inference import run_mistral_ocr
+from .db import get_database, get_products_collection
+from .product_index import current_product_index, get_product_index
+from .index_sync import start_index_sync
+from .snapshot import start_snapshot_watcher
+from .ann import backend_params_from_env
+from .resources import registry
+from .recipe_scaling import CANONICAL_SERVINGS, scale_ingredient, servings_factor
+from .record_stream import astream_records
+from .fast_path import parse_plain_list, fast_path_counter
+from .request_log import current_trace, record_items, record_stage, start_trace
+from .metrics import metric, render as render_metrics
+from .filters import ProductFilters
+from .responses import FastJsonResponse, ProductTable, compact_recipe_items, compact_shopping_items, wants_compact
+from .streaming import growing_batches, negotiate_stream, streaming_response
 
 load_dotenv()
 
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
-db = client["shopping"]
-products_collection = db["products"]
+# Models, clients and chains live in api.resources.registry and are built on
+# first use (or by warm_up), so importing this module stays cheap
 
-# Model for embedding
-model = SentenceTransformer("all-MiniLM-L6-v2")
+async def run_cpu_bound(func, *args):
+    """Run a CPU-heavy function on the shared thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context over so stages in the pool report to its trace
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(registry.get("cpu_executor"), partial(context.run, func, *args))
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-001",
-    google_api_key=os.getenv("GOOGLE_API_KEY")
-)
-chain = get_chain(llm=llm)
-recipe_chain = get_chain_recipe(llm=llm)
+# Workers map a shared on-disk snapshot when INDEX_SNAPSHOT_DIR is set
+snapshot_dir = os.getenv("INDEX_SNAPSHOT_DIR")
 
-# To find the similarity 
-def cosine_similarity(vec1, vec2):
-    v1 = np.array(vec1)
-    v2 = np.array(vec2)
-    return float(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)))
+# vector, hybrid (vector + BM25 fused) or lexical (BM25 shortlist, vector re-rank)
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "vector")
 
-def parse_recipe_ingredients(recipe_response):
-    ingredients = []
+def load_product_index():
+    """Return the resident product index, starting its refresh thread on first use.
+
+    A snapshot index is refreshed by publishing a new snapshot, never by
+    syncing it against Mongo.
+    """
+    started = time.perf_counter()
+    product_index = get_product_index(get_products_collection(), snapshot_dir)
+    record_stage("catalog", time.perf_counter() - started)
+    if snapshot_dir:
+        start_snapshot_watcher(
+            snapshot_dir,
+            int(os.getenv("SNAPSHOT_CHECK_INTERVAL", 10)),
+            getattr(product_index, "snapshot_version", None),
+            rerank=int(os.getenv("ANN_RERANK", 0)),
+            **backend_params_from_env()
+        )
+    else:
+        start_index_sync(get_products_collection(), int(os.getenv("INDEX_SYNC_INTERVAL", 0)))
+    return product_index
+
+def warm_up(fork_safe_only=False):
+    """Load models and the catalog ahead of the first request and print the timings.
+
+    Background sync threads are not started here; they start lazily in each
+    worker, since threads do not survive a fork.
+    """
+    registry.warm_up(fork_safe_only=fork_safe_only)
 
+    started = time.perf_counter()
+    get_product_index(get_products_collection(), snapshot_dir)
+    registry.record("product_index", time.perf_counter() - started)
+
+    report = registry.report()
+    for name, timing in report.items():
+        print(f"  {name:<16} {timing['seconds']:.3f}s")
+    return report
+
+def parse_recipe_ingredient(ingredient):
+    """Parse one 'name|quantity|unit' record."""
+    parts = ingredient.split("|")
+    if len(parts) >= 3:
+        name = parts[0].strip()
+        quantity = parts[1].strip()
+        unit = parts[2].strip()
+
+        return {
+            "name": name,
+            "quantity": quantity,
+            "unit": unit,
+            "search_term": name 
+        }
+    return {
+        "name": ingredient,
+        "quantity": None,
+        "unit": None,
+        "search_term": ingredient
+    }
+
+def parse_recipe_ingredients(recipe_response):
     raw_ingredients = [item.strip() for item in recipe_response.split(",") if item.strip()]
+    return [parse_recipe_ingredient(ingredient) for ingredient in raw_ingredients]
+
+async def fetch_recipe_ingredients(recipe_name, servings):
+    """Get a recipe's ingredients at the canonical size and scale them to servings.
+
+    Every serving count shares one cached LLM response per recipe.
+    """
+    return [ingredient async for ingredient in stream_recipe_ingredients(recipe_name, servings)]
+
+async def stream_recipe_ingredients(recipe_name, servings):
+    """Yield each scaled ingredient as soon as the LLM finishes writing it."""
+    factor = servings_factor(CANONICAL_SERVINGS, max(1, servings))
+    records = astream_records(registry.get("recipe_chain"), {
+        "recipe_name": recipe_name,
+        "servings": CANONICAL_SERVINGS
+    })
+    async for record in records:
+        yield scale_ingredient(parse_recipe_ingredient(record), factor)
+
+def get_product_recommendations(search_term, product_index, top_k=5, filters=None):
+    """Get product recommendations for a given search term, optionally filtered."""
+    return get_batch_recommendations([search_term], product_index, top_k, filters=filters)[0]
+
+def encode_search_terms(search_terms):
+    """Encode search terms through the embedding cache, one row per term."""
+    started = time.perf_counter()
+    embeddings = registry.get("embedding_cache").encode(search_terms)
+    record_stage("encode", time.perf_counter() - started)
+    return embeddings
 
-    for ingredient in raw_ingredients:
-        parts = ingredient.split("|")
-        if len(parts) >= 3:
-            name = parts[0].strip()
-            quantity = parts[1].strip()
-            unit = parts[2].strip()
-
-            ingredients.append({
-                "name": name,
-                "quantity": quantity,
-                "unit": unit,
-                "search_term": name 
-            })
+def precomputed_recommendations(search_terms, product_index, top_k, filters=None):
+    """Recommendations for terms found in the precomputed term table (unfiltered searches only)."""
+    table = registry.get("term_table")
+    if table is None or filters is not None:
+        return {}
+    return table.lookup(search_terms, product_index, top_k, retrieval_mode)
+
+def get_batch_recommendations(search_terms, product_index, top_k=5, query_embeddings=None, filters=None):
+    """Get product recommendations for many search terms with one encoder call.
+
+    Terms in the precomputed term table are looked up without encoding.
+    Pass `query_embeddings` (one row per term) to reuse vectors already encoded,
+    and `filters` (a ProductFilters) to only score matching products.
+    """
+    return recommend_terms(search_terms, product_index, top_k, query_embeddings, filters)[0]
+
+def recommend_terms(search_terms, product_index, top_k=5, query_embeddings=None, filters=None):
+    """get_batch_recommendations, also returning the query vector used for each term.
+
+    Terms answered from the term table were never encoded and get None.
+    """
+    if not search_terms:
+        return [], []
+    results = precomputed_recommendations(search_terms, product_index, top_k, filters)
+    first_rows = {}
+    for row, term in enumerate(search_terms):
+        if term not in results:
+            first_rows.setdefault(term, row)
+    vectors = {}
+    if first_rows:
+        if query_embeddings is None:
+            queries = encode_search_terms(list(first_rows))
         else:
-            ingredients.append({
-                "name": ingredient,
-                "quantity": None,
-                "unit": None,
-                "search_term": ingredient
-            })
-    return ingredients
-
-def get_product_recommendations(search_term, all_products, top_k=5):
-    """Get product recommendations for a given search term."""
-    query_embedding = model.encode(search_term).tolist()
-    scored = []
-
-    for product in all_products:
-        if "embedding" in product:
-            score = cosine_similarity(query_embedding, product["embedding"])
-            scored.append((score, product))
-
-    # Get top matches
-    top_matches = sorted(scored, key=lambda x: x[0], reverse=True)[:top_k]
-    return [match[1] for match in top_matches]
-
-def process_shopping_mode(items_text, all_products):
-    """Process shopping list items and return recommendations."""
-    response = chain.invoke({"input": items_text})
-    print("Response:", response)
-
-    raw_items = [item.strip() for item in response.split(",") if item.strip()]
-    
+            queries = query_embeddings[list(first_rows.values())]
+        vectors = dict(zip(first_rows, queries))
+        results.update(zip(
+            first_rows,
+            product_index.search_many(queries, top_k, filters, texts=list(first_rows), mode=retrieval_mode)
+        ))
+    return [results[term] for term in search_terms], [vectors.get(term) for term in search_terms]
+
+def categorize_ingredients(names, query_embeddings=None):
+    """Categorize a list of ingredient names with the shared taxonomy.
+
+    `query_embeddings` may hold the retrieval vector of each name (None where
+    there is none); only names without one are encoded for the fallback.
+    """
+    return registry.get("taxonomy").categorize_many(
+        names, query_embeddings, encode=encode_search_terms
+    )
+
+def split_items(response):
+    """Split a comma-separated LLM response into item names."""
+    return [item.strip() for item in response.split(",") if item.strip()]
+
+def build_shopping_result(raw_items, product_index, filters=None):
+    """Attach product recommendations to each shopping list item."""
+    return shopping_result(raw_items, get_batch_recommendations(raw_items, product_index, filters=filters))
+
+def shopping_result(raw_items, all_recommendations):
     result = []
-    for item in raw_items:
-        recommendations = get_product_recommendations(item, all_products)
+    for item, recommendations in zip(raw_items, all_recommendations):
         result.append({
             "name": item.capitalize(),
             "recommendations": recommendations
@@ -90,106 +201,264 @@ def process_shopping_mode(items_text, all_products):
     
     return result
 
-def process_recipe_mode(recipe_name, servings, all_products):
-    """Process recipe and return ingredients with recommendations."""
-    try:
-        recipe_response = recipe_chain.invoke({
-            "recipe_name": recipe_name,
-            "servings": servings
+def build_recipe_items(ingredients, product_index, filters=None):
+    """Attach recommendations and a category to each recipe ingredient."""
+    # Terms are encoded at most once: retrieval encodes those missing from the
+    # term table, and categorization reuses those vectors
+    search_terms = [ingredient["search_term"] for ingredient in ingredients]
+    all_recommendations, embeddings = recommend_terms(search_terms, product_index, filters=filters)
+    all_categories = categorize_ingredients(search_terms, embeddings)
+    return recipe_items(ingredients, all_recommendations, all_categories)
+
+def recipe_items(ingredients, all_recommendations, all_categories):
+    items = []
+    for ingredient, recommendations, category in zip(ingredients, all_recommendations, all_categories):
+        # Add quantity and unit info to recommendations
+        enhanced_recommendations = []
+        for rec in recommendations:
+            enhanced_rec = rec.copy()
+            if ingredient["quantity"] and ingredient["unit"]:
+                enhanced_rec["quantity"] = ingredient["quantity"]
+                enhanced_rec["unit"] = ingredient["unit"]
+            enhanced_recommendations.append(enhanced_rec)
+
+        items.append({
+            "name": ingredient["name"],
+            "quantity": ingredient["quantity"],
+            "unit": ingredient["unit"],
+            "category": category,
+            "recommendations": enhanced_recommendations
         })
-        print(f"Recipe Response: {recipe_response}")
+    return items
 
-        ingredients = parse_recipe_ingredients(recipe_response)
-        
-        categories = {}
-        
-        for ingredient in ingredients:
-            # Get product recommendations for this ingredient
-            recommendations = get_product_recommendations(
-                ingredient["search_term"], 
-                all_products
-            )
-            
-            # Add quantity and unit info to recommendations
-            enhanced_recommendations = []
-            for rec in recommendations:
-                enhanced_rec = rec.copy()
-                if ingredient["quantity"] and ingredient["unit"]:
-                    enhanced_rec["quantity"] = ingredient["quantity"]
-                    enhanced_rec["unit"] = ingredient["unit"]
-                enhanced_recommendations.append(enhanced_rec)
-            
-            # Categorize ingredient
-            category = categorize_ingredient(ingredient["name"])
-            
-            if category not in categories:
-                categories[category] = []
-            
-            categories[category].append({
-                "name": ingredient["name"],
-                "quantity": ingredient["quantity"],
-                "unit": ingredient["unit"],
-                "recommendations": enhanced_recommendations
-            })
-        
-        result = []
-        for category_name, items in categories.items():
-            category_recommendations = []
-            for item in items:
-                for rec in item["recommendations"]:
-                    category_recommendations.append({
-                        "name": rec["name"],
-                        "brand": rec.get("brand", ""),
-                        "price": rec.get("price", ""),
-                        "quantity": rec.get("quantity"),
-                        "unit": rec.get("unit"),
-                        "category": rec.get("category", "")
-                    })
-            
-            result.append({
-                "name": category_name,
-                "recommendations": category_recommendations
-            })
+def group_recipe_items(items):
+    """Group recipe items by category into the response layout."""
+    categories = {}
+    for item in items:
+        categories.setdefault(item["category"], []).append(item)
+
+    result = []
+    for category_name, items in categories.items():
+        category_recommendations = []
+        for item in items:
+            for rec in item["recommendations"]:
+                category_recommendations.append({
+                    "name": rec["name"],
+                    "brand": rec.get("brand", ""),
+                    "price": rec.get("price", ""),
+                    "quantity": rec.get("quantity"),
+                    "unit": rec.get("unit"),
+                    "category": rec.get("category", "")
+                })
         
-        return result
+        result.append({
+            "name": category_name,
+            "recommendations": category_recommendations
+        })
+    
+    return result
+
+def build_recipe_result(ingredients, product_index, filters=None):
+    """Group recipe ingredients by category with their product recommendations."""
+    return group_recipe_items(build_recipe_items(ingredients, product_index, filters))
+
+async def stream_shopping_items(items_text):
+    """Yield item names from shopping input, asking the LLM only when needed.
+
+    LLM items are yielded one by one while the completion is still streaming.
+    """
+    # Single words the taxonomy doesn't know may be compound products for the LLM to break down
+    raw_items = parse_plain_list(items_text, registry.get("taxonomy").match)
+    fast_path_counter.record(raw_items is not None)
+    if raw_items is None:
+        async for item in astream_records(registry.get("chain"), {"input": items_text}):
+            yield item
+        return
+    for item in raw_items:
+        yield item
+
+async def pipeline_records(records, build, product_index_task, batch_sizes=None):
+    """Score records while the LLM is still producing them.
+
+    A reader task pulls records off the stream into a queue. Each time the
+    previous batch has been scored, everything queued so far is scored as
+    the next batch, so retrieval overlaps generation and batches grow on
+    their own when records arrive faster than they are scored. `batch_sizes`
+    optionally caps each batch (streaming responses start small).
+
+    Yields ("results", built_items) per batch and, as soon as the stream
+    ends, ("items", all_records).
+    """
+    queue = asyncio.Queue()
+    end = object()
+    entries = []
+
+    async def read():
+        try:
+            async for record in records:
+                entries.append(record)
+                queue.put_nowait(record)
+        finally:
+            queue.put_nowait(end)
+
+    started = time.perf_counter()
+    reader = asyncio.create_task(read())
+    try:
+        finished = False
+        while not finished:
+            limit = next(batch_sizes) if batch_sizes else None
+            batch = [await queue.get()]
+            while not queue.empty() and batch[-1] is not end and (limit is None or len(batch) < limit):
+                batch.append(queue.get_nowait())
+            if batch[-1] is end:
+                finished = True
+                batch.pop()
+                await reader  # re-raise a failed LLM call
+                record_stage("expand", time.perf_counter() - started)
+                record_items(entries)
+                yield "items", list(entries)
+            if batch:
+                waited = time.perf_counter()
+                product_index = await product_index_task
+                scoring = time.perf_counter()
+                record_stage("catalog_wait", scoring - waited)
+                results = await run_cpu_bound(build, batch, product_index)
+                record_stage("score", time.perf_counter() - scoring)
+                yield "results", results
+    finally:
+        reader.cancel()
+
+async def collect_pipeline(records, build, product_index_task):
+    results = []
+    async for kind, payload in pipeline_records(records, build, product_index_task):
+        if kind == "results":
+            results.extend(payload)
+    return results
+
+async def process_shopping_mode(items_text, product_index_task, filters=None, table=None):
+    """Process shopping list items and return recommendations.
+
+    Items are scored as the LLM streams them, so loading the catalog and
+    retrieval overlap the Gemini round trip. Plain item lists skip the LLM.
+    With a ProductTable, items reference products by id (compact format).
+    """
+    items = await collect_pipeline(
+        stream_shopping_items(items_text), partial(build_shopping_result, filters=filters), product_index_task
+    )
+    return compact_shopping_items(items, table) if table is not None else items
+
+async def process_recipe_mode(recipe_name, servings, product_index_task, filters=None, table=None):
+    """Process recipe and return ingredients with recommendations."""
+    try:
+        items = await collect_pipeline(
+            stream_recipe_ingredients(recipe_name, servings),
+            partial(build_recipe_items, filters=filters),
+            product_index_task
+        )
+        return compact_recipe_items(items, table) if table is not None else group_recipe_items(items)
 
     except Exception as e:
         print(f"Error processing recipe: {e}")
-        return process_shopping_mode(recipe_name, all_products)
-    
+        return await process_shopping_mode(recipe_name, product_index_task, filters, table)
+
+async def stream_item_records(mode, records, build, product_index_task, recipe_name, servings):
+    index = 0
+    pipeline = pipeline_records(records, build, product_index_task, growing_batches())
+    async for kind, payload in pipeline:
+        if kind == "items":
+            yield items_record(mode, payload, recipe_name, servings)
+            continue
+        # The pipeline has awaited the catalog before scoring the first batch
+        if not len(product_index_task.result()):
+            yield {"type": "error", "error": "No products found in database"}
+            return
+        for item in payload:
+            yield {"type": "item", "index": index, **item}
+            index += 1
+
+async def stream_records(mode, items_text, recipe_name, servings, product_index_task, filters=None, trace=None):
+    """Yield one record per item as soon as it is scored.
+
+    Records are one {"type": "item"} per item (recipe items carry their
+    category), the full {"type": "items"} list once the LLM has finished
+    (usually before the last items are scored), then {"type": "done"}.
+    Failures after the stream has started are sent as {"type": "error"}.
+    """
+    # The body runs while the response is sent, outside the view's context
+    if trace is not None:
+        current_trace.set(trace)
+    status = 200
+    try:
+        count = 0
+        last = None
+        try:
+            if mode == "recipe":
+                records = stream_item_records(
+                    mode, stream_recipe_ingredients(recipe_name, servings), partial(build_recipe_items, filters=filters),
+                    product_index_task, recipe_name, servings
+                )
+            else:
+                records = stream_item_records(
+                    mode, stream_shopping_items(items_text), partial(build_shopping_result, filters=filters),
+                    product_index_task, recipe_name, servings
+                )
+            async for record in records:
+                count += record["type"] == "item"
+                last = record
+                yield record
+        except Exception as e:
+            # Same fallback as process_recipe_mode, unless items were already sent
+            if mode != "recipe" or count:
+                raise
+            print(f"Error processing recipe: {e}")
+            mode = "shopping"
+            records = stream_item_records(
+                mode, stream_shopping_items(recipe_name), partial(build_shopping_result, filters=filters),
+                product_index_task, recipe_name, servings
+            )
+            async for record in records:
+                count += record["type"] == "item"
+                last = record
+                yield record
+
+        if last is None or last["type"] != "error":
+            yield {"type": "done", "mode": mode, "count": count}
+        else:
+            status = 500
+
+    except Exception as e:
+        print(f"Processing error: {e}")
+        status = 500
+        yield {"type": "error", "error": f"Processing failed: {str(e)}"}
+    finally:
+        log_request(trace, status)
+
+def log_request(trace, status=200):
+    """Hand a finished request to the background request log."""
+    logger = registry.get("request_log")
+    if logger is not None and trace is not None:
+        logger.log(trace, status)
+
+def items_record(mode, entries, recipe_name, servings):
+    if mode == "recipe":
+        return {
+            "type": "items",
+            "mode": "recipe",
+            "recipe_info": {"name": recipe_name, "servings": servings},
+            "items": [
+                {"name": entry["name"], "quantity": entry["quantity"], "unit": entry["unit"]}
+                for entry in entries
+            ]
+        }
+    return {"type": "items", "mode": "shopping", "items": [entry.capitalize() for entry in entries]}
 
 def categorize_ingredient(ingredient_name):
-    """Simple ingredient categorization."""
-    ingredient_lower = ingredient_name.lower()
-    
-    # Protein categorization
-    proteins = ["chicken", "beef", "pork", "fish", "salmon", "turkey", "ham", "bacon", 
-               "egg", "tofu", "beans", "lentils", "chickpeas", "shrimp", "crab", "lobster"]
-    if any(protein in ingredient_lower for protein in proteins):
-        return "Proteins"
-    
-    # Dairy categorization
-    dairy = ["milk", "cheese", "butter", "cream", "yogurt", "sour cream", "cottage cheese"]
-    if any(dairy_item in ingredient_lower for dairy_item in dairy):
-        return "Dairy & Eggs"
-    
-    # Vegetables categorization
-    vegetables = ["onion", "garlic", "tomato", "potato", "carrot", "celery", "pepper", 
-                 "lettuce", "spinach", "broccoli", "cauliflower", "cucumber", "mushroom"]
-    if any(veg in ingredient_lower for veg in vegetables):
-        return "Fresh Produce"
-    
-    # Pantry staples
-    pantry = ["flour", "sugar", "salt", "pepper", "oil", "vinegar", "spice", "herb", 
-             "rice", "pasta", "bread", "sauce", "stock", "broth"]
-    if any(pantry_item in ingredient_lower for pantry_item in pantry):
-        return "Pantry Staples"
-    
-    return "Other Ingredients"
+    """Categorize a single ingredient (see categorize_ingredients for lists)."""
+    return categorize_ingredients([ingredient_name])[0]
 
 
 @csrf_exempt 
-def get_recipe_ingredients(request):
+async def get_recipe_ingredients(request):
     """Endpoint to get just the ingredients list for a recipe."""
     if request.method == "POST":
         try:
@@ -200,17 +469,16 @@ def get_recipe_ingredients(request):
                 servings = 1
 
             if not recipe_name.strip():
-                return JsonResponse({"error": "Recipe name is required"}, status=400)
+                return FastJsonResponse({"error": "Recipe name is required"}, status=400)
             
-            recipe_response = recipe_chain.invoke({
-                "recipe_name": recipe_name,
-                "servings": servings
-            })
-            
-            ingredients = parse_recipe_ingredients(recipe_response)
+            ingredients = await fetch_recipe_ingredients(recipe_name, servings)
             
+            categories = await run_cpu_bound(
+                categorize_ingredients, [ingredient["name"] for ingredient in ingredients]
+            )
+
             formatted_ingredients = []
-            for ingredient in ingredients:
+            for ingredient, category in zip(ingredients, categories):
                 display_text = ingredient['name']
                 if ingredient.get('quantity') and ingredient.get('unit'):
                     display_text = f"{ingredient['quantity']} {ingredient['unit']} {ingredient['name']}"
@@ -220,13 +488,13 @@ def get_recipe_ingredients(request):
                     "quantity": ingredient.get("quantity"),
                     "unit": ingredient.get("unit"),
                     "display": display_text,
-                    "category": categorize_ingredient(ingredient["name"])
+                    "category": category
                 })
 
             
             print(formatted_ingredients)
             
-            return JsonResponse({
+            return FastJsonResponse({
                 "recipe_name": recipe_name,
                 "servings": servings,
                 "ingredients": formatted_ingredients,
@@ -234,19 +502,23 @@ def get_recipe_ingredients(request):
             }, status=200)
             
         except Exception as e:
-            return JsonResponse({"error": f"Failed to fetch ingredients: {str(e)}"}, status=500)
+            return FastJsonResponse({"error": f"Failed to fetch ingredients: {str(e)}"}, status=500)
     
-    return JsonResponse({"error": "POST method required"}, status=405)
+    return FastJsonResponse({"error": "POST method required"}, status=405)
 
 @csrf_exempt
-def index(request):
+async def index(request):
     """Main endpoint for processing shopping lists and recipes."""
     if request.method == "POST":
         mode = "shopping"  
         items_text = ""
         recipe_name = ""
         servings = 4
+        raw_filters = None
+        response_format = None
         
+        image_file = None
+
         # Handle multipart form data(like image, text)
         if request.content_type and request.content_type.startswith("multipart/form-data"):
             mode = request.POST.get("mode", "shopping")
@@ -258,15 +530,16 @@ def index(request):
                 items_text = request.POST.get("items", "")
             
             # Handle image upload (only for shopping mode)
-            image_file = request.FILES.get("image")
-            if image_file and mode == "shopping":
-                try:
-                    mistral_api_key = os.getenv("MISTRAL_API_KEY")
-                    if mistral_api_key:
-                        extracted_text = run_mistral_ocr(image_file, mistral_api_key)
-                        items_text += ", " + extracted_text if items_text else extracted_text
-                except Exception as e:
-                    return JsonResponse({"error": f"OCR processing failed: {str(e)}"}, status=400)
+            if mode == "shopping":
+                image_file = request.FILES.get("image")
+
+            response_format = request.POST.get("response_format")
+
+            # Form posts carry filters as a JSON-encoded field
+            try:
+                raw_filters = json.loads(request.POST.get("filters") or "null")
+            except ValueError:
+                return FastJsonResponse({"error": "'filters' must be a JSON object"}, status=400)
         
         else:
             try:
@@ -278,56 +551,95 @@ def index(request):
                     servings = int(data.get("servings", 4))
                 else:
                     items_text = data.get("items", "")
+                raw_filters = data.get("filters")
+                response_format = data.get("response_format")
             except Exception:
-                return JsonResponse({"error": "Invalid JSON body"}, status=400)
+                return FastJsonResponse({"error": "Invalid JSON body"}, status=400)
 
-        if mode == 'recipe':
-            if not recipe_name.strip():
-                return JsonResponse({"error": "Recipe name is required"}, status=400)
+        try:
+            filters = ProductFilters.from_request(raw_filters)
+        except ValueError as e:
+            return FastJsonResponse({"error": f"Invalid filters: {e}"}, status=400)
+
+        if mode == 'recipe' and not recipe_name.strip():
+            return FastJsonResponse({"error": "Recipe name is required"}, status=400)
+
+        # Accept: application/x-ndjson or text/event-stream opts into streaming
+        stream_format = negotiate_stream(request)
+
+        trace = start_trace(mode=mode, text=items_text, recipe_name=recipe_name, servings=servings)
+
+        # The catalog loads in the background while OCR and the LLM run
+        product_index_task = asyncio.create_task(
+            asyncio.to_thread(load_product_index)
+        )
+
+        if image_file and os.getenv("MISTRAL_API_KEY"):
+            try:
+                started = time.perf_counter()
+                extracted_text = await asyncio.to_thread(registry.get("ocr").extract_text, image_file)
+                record_stage("ocr", time.perf_counter() - started)
+                items_text += ", " + extracted_text if items_text else extracted_text
+                trace.text = items_text
+            except Exception as e:
+                product_index_task.cancel()
+                log_request(trace, 400)
+                return FastJsonResponse({"error": f"OCR processing failed: {str(e)}"}, status=400)
+
+        if mode != 'recipe' and not items_text.strip():
+            product_index_task.cancel()
+            log_request(trace, 200)
+            return FastJsonResponse({"items": []}, status=200)
+
+        if stream_format:
+            return streaming_response(
+                stream_records(mode, items_text, recipe_name, servings, product_index_task, filters, trace),
+                stream_format
+            )
+
+        # "response_format": "compact" lists each product once and references it by id
+        table = ProductTable() if wants_compact(response_format) else None
+
+        if mode == "recipe":
+            work_task = asyncio.create_task(process_recipe_mode(recipe_name, servings, product_index_task, filters, table))
         else:
-            if not items_text.strip():
-                return JsonResponse({"items": []}, status=200)
-            
+            work_task = asyncio.create_task(process_shopping_mode(items_text, product_index_task, filters, table))
+
         try:
-            all_products = list(products_collection.find({}, {
-                "_id": 0,
-                "embedding": 1,
-                "name": 1,
-                "brand": 1,
-                "price": 1,
-                "category": 1,
-                "link": 1
-            }))
+            product_index = await product_index_task
             
-            if not all_products:
-                return JsonResponse({"error": "No products found in database"}, status=500)
+            if not len(product_index):
+                work_task.cancel()
+                log_request(trace, 500)
+                return FastJsonResponse({"error": "No products found in database"}, status=500)
                 
         except Exception as e:
-            return JsonResponse({"error": f"Database error: {str(e)}"}, status=500)
+            work_task.cancel()
+            log_request(trace, 500)
+            return FastJsonResponse({"error": f"Database error: {str(e)}"}, status=500)
 
         try:
+            response_items = await work_task
+            body = {
+                "items": response_items,
+                "mode": "recipe" if mode == "recipe" else "shopping"
+            }
             if mode == "recipe":
-                response_items = process_recipe_mode(recipe_name, servings, all_products)
-                return JsonResponse({
-                    "items": response_items,
-                    "mode": "recipe",
-                    "recipe_info": {
-                        "name": recipe_name,
-                        "servings": servings
-                    }
-                }, status=200)
-            else:
-                response_items = process_shopping_mode(items_text, all_products)
-                return JsonResponse({
-                    "items": response_items,
-                    "mode": "shopping"
-                }, status=200)
+                body["recipe_info"] = {
+                    "name": recipe_name,
+                    "servings": servings
+                }
+            if table is not None:
+                body["products"] = table.products
+            log_request(trace, 200)
+            return FastJsonResponse(body, status=200)
                 
         except Exception as e:
             print(f"Processing error: {e}")
-            return JsonResponse({"error": f"Processing failed: {str(e)}"}, status=500)
+            log_request(trace, 500)
+            return FastJsonResponse({"error": f"Processing failed: {str(e)}"}, status=500)
 
-    return JsonResponse({
+    return FastJsonResponse({
         "message": "Send a POST request with shopping items, image, or recipe information.",
         "modes": {
             "shopping": "Send 'items' field with shopping list or upload image",
@@ -335,17 +647,78 @@ def index(request):
         }
     }, status=200)
 
+def index_status():
+    """Summary of the resident index; cheap enough for health checks (never hashes the catalog)."""
+    product_index = current_product_index()
+    if product_index is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "products": len(product_index),
+        "catalog_version": product_index.known_catalog_version(),
+        "snapshot_version": getattr(product_index, "snapshot_version", None),
+        "ann": type(product_index.ann).__name__ if product_index.ann is not None else "exact",
+        "retrieval_mode": retrieval_mode
+    }
+
+def loaded_stats(name):
+    """Stats of a registry resource, or None if it is not built (never builds it)."""
+    value = registry.get(name) if registry.is_loaded(name) else None
+    return value.stats() if value is not None else None
+
 def health_check(request):
     """Health check endpoint."""
     try:
-        db.command("ping")
-        return JsonResponse({
+        # Fail fast instead of waiting out server selection when Mongo is down
+        with pymongo.timeout(float(os.getenv("HEALTH_DB_TIMEOUT", 2))):
+            get_database().command("ping")
+        return FastJsonResponse({
             "status": "healthy",
             "database": "connected",
-            "model": "loaded"
+            "model": "loaded" if registry.is_loaded("encoder") else "not loaded",
+            "index": index_status(),
+            "resources": registry.status(),
+            "fast_path": fast_path_counter.stats(),
+            "ocr": loaded_stats("ocr"),
+            "term_table": loaded_stats("term_table")
         }, status=200)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "status": "unhealthy",
             "error": str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+def metrics(request):
+    """Prometheus metrics: request and stage latency, cache hit rates, model and index status."""
+    caches = {}
+    embedding = loaded_stats("embedding_cache")
+    if embedding is not None:
+        shared = embedding.pop("shared", None)
+        caches["embedding"] = embedding
+        if shared is not None:
+            caches["embedding_shared"] = shared
+    for name, resource in (("llm", "llm_cache"), ("ocr", "ocr_cache")):
+        stats = loaded_stats(resource)
+        if stats is not None:
+            caches[name] = stats
+    term_table = loaded_stats("term_table")
+    if term_table is not None:
+        caches["term_table"] = dict(term_table, size=term_table["terms"])
+
+    product_index = current_product_index()
+    fast_path = fast_path_counter.stats()
+    extra = metric("curator_catalog_products", "gauge", "Products in this worker's index.",
+                   [({}, len(product_index) if product_index is not None else 0)])
+    extra += metric("curator_fast_path_total", "counter", "Shopping inputs split locally or sent to the LLM.", [
+        ({"path": "skipped_llm"}, fast_path["skipped_llm"]),
+        ({"path": "used_llm"}, fast_path["used_llm"])
+    ])
+    ocr = loaded_stats("ocr")
+    if ocr is not None:
+        extra += metric("curator_ocr_calls_total", "counter", "Uploads sent to the OCR API.", [({}, ocr["calls"])])
+    request_log = loaded_stats("request_log")
+    if request_log is not None:
+        extra += metric("curator_request_log_rows_total", "counter", "Request log rows by outcome.", [
+            ({"state": state}, request_log[state]) for state in ("written", "dropped", "failed")
+        ])
+    return HttpResponse(render_metrics(registry, caches, extra), content_type="text/plain; version=0.0.4; charset=utf-8")
\ No newline at end of file
@@ -0,0 +1,20 @@
+# gunicorn -c gunicorn.conf.py mysite.asgi:application -k uvicorn.workers.UvicornWorker
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+
+# Load the app, the encoder weights and the catalog once in the master so
+# forked workers share them copy-on-write instead of each loading a copy
+preload_app = True
+
+
+def when_ready(server):
+    from api.views import warm_up
+    server.log.info("Warming up shared resources")
+    warm_up(fork_safe_only=True)
+
+
+def post_fork(server, worker):
+    from api.resources import registry
+    registry.after_fork()
@@ -15,31 +15,6 @@ def encode_image_to_base64(image_path):
         return None
 
 
-def run_mistral_ocr(file_obj, api_key):
-    """
-    Accepts a Django InMemoryUploadedFile or file-like object,
-    encodes it and sends it to Mistral OCR API.
-    Returns the extracted text (as markdown).
-    """
-    try:
-        base64_image = base64.b64encode(file_obj.read()).decode("utf-8")
-
-        client = Mistral(api_key=api_key)
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest",
-            document={
-                "type": "image_url",
-                "image_url": f"data:image/jpeg;base64,{base64_image}"
-            },
-            include_image_base64=False # Do not return the image in response
-        )
-
-        return "\n".join([page.markdown.strip() for page in ocr_response.pages])
-
-    except Exception as e:
-        raise RuntimeError(f"Mistral OCR failed: {e}")
-
-
 # === Standalone test section ===
 if __name__ == "__main__":
     # Local image testing
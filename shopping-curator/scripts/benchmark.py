@@ -0,0 +1,512 @@
+"""
+Offline benchmark of the curation pipeline on a synthetic catalog.
+
+    python scripts/benchmark.py                                    # 10k products, default scenarios
+    python scripts/benchmark.py --catalog-sizes 1000,100000,1000000 --concurrency 1,8,32
+    python scripts/benchmark.py --output after.json --compare before.json
+    python scripts/benchmark.py --export-catalog catalog.jsonl --catalog-sizes 100000
+
+Needs no network, API keys or MongoDB. The catalog is generated in the
+load_products.py schema, and Gemini and Mistral are replaced by
+deterministic fakes with configurable latency. Query encoding uses a
+hashing encoder unless --encoder real is passed. The views run in-process
+through Django's async test client, so the measurements include routing,
+middleware and JSON encoding but no network.
+
+Each scenario runs at every concurrency level. The script prints p50, p95
+and p99 latency and throughput, and writes them to --output as JSON for
+comparison across commits.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import types
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORIES = {
+    "Dairy": ["milk", "whole milk", "butter", "cheddar cheese", "greek yogurt", "sour cream", "heavy cream", "eggs"],
+    "Produce": ["apples", "bananas", "spinach", "tomatoes", "onion", "garlic", "potatoes", "carrots", "lemon"],
+    "Meat": ["chicken breast", "ground beef", "bacon", "pork chops", "salmon", "turkey", "sausage"],
+    "Bakery": ["bread", "bagels", "tortillas", "croissants", "hamburger buns"],
+    "Pantry": ["rice", "pasta", "flour", "sugar", "olive oil", "tomato sauce", "black beans", "peanut butter"],
+    "Snacks": ["chips", "cookies", "crackers", "popcorn", "granola bars"],
+    "Beverages": ["coffee", "tea", "orange juice", "sparkling water", "cola"],
+    "Frozen Food": ["frozen pizza", "ice cream", "frozen peas", "waffles"],
+    "Household": ["paper towels", "trash bags", "aluminum foil", "dish soap", "laundry detergent"],
+    "Personal Care": ["toothpaste", "shampoo", "deodorant", "body wash"],
+}
+BRANDS = [
+    "Great Value", "Kellogg's", "General Mills", "Kraft", "Tide", "Heinz", "Oreo", "Chobani",
+    "Sargento", "Eggo", "Quaker", "Nature Valley", "Colgate", "Dove", "Bounty", "Clorox",
+    "Barilla", "Tyson", "Dole", "Pepsi", "Lipton", "Land O Lakes", "Horizon", "Marketside",
+]
+VARIANTS = ["Original", "Organic", "Classic", "Family Size", "Reduced Fat", "Extra", "Value Pack", "Lite"]
+SIZES = ["12 oz", "16 oz", "1 lb", "2 lb", "32 oz", "6 ct", "12 ct", "1 gal"]
+UNITS = ["cup", "cups", "tablespoons", "teaspoon", "pounds", "ounces", "cloves", "can", "pieces"]
+QUANTITIES = ["1", "2", "3", "1/2", "1/4", "3/4", "1-2"]
+RECIPES = ["pancakes", "chicken tikka masala", "lasagna", "caesar salad", "tacos", "banana bread",
+           "beef stew", "fried rice", "carbonara", "chili", "omelette", "tomato soup"]
+REQUESTS = ["stuff for a taco night", "a birthday party for ten kids", "breakfast for the week",
+            "weekend barbecue", "movie night snacks", "cleaning supplies for a new apartment"]
+
+
+class HashingEncoder:
+    """Deterministic stand-in for the sentence encoder.
+
+    Each token gets a fixed random vector and a text is the sum of its token
+    vectors, so texts sharing words land near each other. `latency` adds a
+    fixed cost per encoded text.
+    """
+
+    def __init__(self, dim=384, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.vectors = {}
+
+    def token_vector(self, token):
+        vector = self.vectors.get(token)
+        if vector is None:
+            seed = int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self.vectors[token] = vector
+        return vector
+
+    def encode(self, texts, **kwargs):
+        from api.lexical import tokenize
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text) or [str(text)]:
+                out[row] += self.token_vector(token)
+        return out[0] if single else out
+
+
+class FakeChain:
+    """Deterministic stand-in for the Gemini chains, streamed with latency.
+
+    The first chunk arrives after `latency` seconds and each further
+    record after `record_latency` seconds, like a streamed completion.
+    """
+
+    def __init__(self, kind, latency=0.3, record_latency=0.02):
+        self.kind = kind
+        self.latency = latency
+        self.record_latency = record_latency
+        self.terms = [term for terms in CATEGORIES.values() for term in terms]
+        self.calls = 0
+
+    def completion(self, inputs):
+        rng = random.Random(zlib.crc32(json.dumps(inputs, sort_keys=True).encode("utf-8")))
+        terms = rng.sample(self.terms, rng.randint(4, 12) if self.kind == "recipe" else rng.randint(3, 8))
+        if self.kind == "recipe":
+            return [f"{term}|{rng.choice(QUANTITIES)}|{rng.choice(UNITS)}" for term in terms]
+        return terms
+
+    async def astream(self, inputs, config=None, **kwargs):
+        self.calls += 1
+        records = self.completion(inputs)
+        await asyncio.sleep(self.latency)
+        for i, record in enumerate(records):
+            if i:
+                await asyncio.sleep(self.record_latency)
+            yield (", " if i else "") + record
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        return "".join([chunk async for chunk in self.astream(inputs)])
+
+
+class FakeOCRClient:
+    """Mistral client stand-in: `client.ocr.process` sleeps, then returns a grocery list."""
+
+    def __init__(self, latency=0.5):
+        self.latency = latency
+        self.ocr = self
+
+    def process(self, model, document, include_image_base64=False):
+        payload = document.get("image_url") or document.get("document_url") or ""
+        rng = random.Random(zlib.crc32(payload[-4096:].encode("utf-8")))
+        time.sleep(self.latency)
+        terms = rng.sample([term for terms in CATEGORIES.values() for term in terms], 6)
+        page = types.SimpleNamespace(markdown="\n".join(f"- {term}" for term in terms))
+        return types.SimpleNamespace(pages=[page])
+
+
+def setup_django(args):
+    """Configure the app for an offline run and install the fakes in the resource registry."""
+    os.environ["RETRIEVAL_MODE"] = args.retrieval_mode
+    os.environ["INDEX_SYNC_INTERVAL"] = "0"
+    os.environ["LLM_CACHE_PATH"] = ""
+    os.environ["OCR_CACHE_PATH"] = ""
+    os.environ["REQUEST_LOG"] = "0"
+    os.environ["MISTRAL_API_KEY"] = "benchmark"
+    # The client is created but never used; a mongodb+srv URI would need DNS
+    os.environ["MONGO_URI"] = "mongodb://localhost:27017/"
+    os.environ.pop("INDEX_SNAPSHOT_DIR", None)
+    os.environ.pop("EMBEDDING_CACHE_PATH", None)
+    if not args.term_table:
+        os.environ.pop("TERM_TABLE_PATH", None)
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+    import django
+    django.setup()
+    from api.resources import registry
+    from api.ocr import OCRService
+
+    if args.encoder == "hashing":
+        encoder = HashingEncoder(args.dim, args.encode_latency)
+        registry.register("encoder", lambda: encoder)
+    registry.register("chain", lambda: FakeChain("shopping", args.llm_latency, args.llm_record_latency), fork_safe=False)
+    registry.register("recipe_chain", lambda: FakeChain("recipe", args.llm_latency, args.llm_record_latency), fork_safe=False)
+    registry.register("ocr", lambda: OCRService(FakeOCRClient(args.ocr_latency)), fork_safe=False)
+    return registry
+
+
+def generate_products(size, seed=0):
+    """Synthetic catalog rows in the load_products.py schema, plus the parts of each name."""
+    rng = np.random.default_rng(seed)
+    nouns = [(category, noun) for category, terms in CATEGORIES.items() for noun in terms]
+    noun_idx = rng.integers(0, len(nouns), size)
+    brand_idx = rng.integers(0, len(BRANDS), size)
+    variant_idx = rng.integers(0, len(VARIANTS), size)
+    size_idx = rng.integers(0, len(SIZES), size)
+    prices = np.round(rng.gamma(2.0, 3.0, size) + 0.5, 2)
+
+    products = []
+    for i in range(size):
+        category, noun = nouns[noun_idx[i]]
+        brand = BRANDS[brand_idx[i]]
+        products.append({
+            "product_id": f"syn-{i:07d}",
+            "name": f"{brand} {VARIANTS[variant_idx[i]]} {noun.title()} {SIZES[size_idx[i]]}",
+            "brand": brand,
+            "price": f"${prices[i]:.2f}",
+            "category": category,
+            "link": f"https://example.com/products/syn-{i:07d}",
+        })
+    return products, (noun_idx, brand_idx, variant_idx, nouns)
+
+
+def build_index(size, encode, seed=0, block=50000):
+    """A ProductIndex over a synthetic catalog, embedded consistently with `encode`.
+
+    Product vectors are sums of precomputed phrase vectors (noun, brand,
+    variant), so a million rows embed in seconds without encoding each name.
+    """
+    from api.product_index import ProductIndex, PRODUCT_FIELDS
+    products, (noun_idx, brand_idx, variant_idx, nouns) = generate_products(size, seed)
+    noun_vectors = np.asarray(encode([noun for _, noun in nouns]), dtype=np.float32)
+    brand_vectors = np.asarray(encode(BRANDS), dtype=np.float32)
+    variant_vectors = np.asarray(encode(VARIANTS), dtype=np.float32)
+
+    matrix = np.empty((size, noun_vectors.shape[1]), dtype=np.float32)
+    for start in range(0, size, block):
+        end = min(size, start + block)
+        rows = 2.0 * noun_vectors[noun_idx[start:end]] + 0.5 * brand_vectors[brand_idx[start:end]]
+        rows += 0.5 * variant_vectors[variant_idx[start:end]]
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        matrix[start:end] = rows
+
+    metadata = [{field: product[field] for field in PRODUCT_FIELDS} for product in products]
+    ids = [product["product_id"] for product in products]
+    return ProductIndex(matrix, metadata, ids, normalized=True), products
+
+
+def make_image(width, height, seed=0):
+    """A phone-photo-sized JPEG: smooth gradients with some noise, like a photographed page."""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    base = (0.6 * x + 0.4 * y) % 256
+    pixels = np.clip(base[..., np.newaxis] + rng.normal(0, 12, (height, width, 1)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.repeat(pixels, 3, axis=2)).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(values):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3), "mean_ms": round(values.mean(), 3)}
+
+
+async def run_async(call, requests, concurrency):
+    """Issue `requests` calls from `concurrency` concurrent workers; returns (latencies, errors, seconds)."""
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception as e:
+                print(f"  request failed: {e}")
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def run_threads(call, requests, concurrency):
+    """Synchronous counterpart of run_async, on a thread pool."""
+    def timed(i):
+        started = time.perf_counter()
+        call(i)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, range(requests)))
+    return latencies, 0, time.perf_counter() - started
+
+
+def view_scenarios(args, client, image):
+    """Async scenarios: name -> (call(i) returning success, request count)."""
+    from api.resources import registry
+    rng = random.Random(args.seed)
+    terms = [term for terms in CATEGORIES.values() for term in terms]
+    # Single words the taxonomy doesn't know send a list to the LLM; keep these on the fast path
+    taxonomy = registry.get("taxonomy")
+    plain_terms = [term for term in terms if " " in term or taxonomy.match(term)]
+    plain_lists = [", ".join(rng.sample(plain_terms, rng.randint(3, 10))) for _ in range(64)]
+
+    def post(body, **kwargs):
+        return client.post("/process/", json.dumps(body), content_type="application/json", **kwargs)
+
+    async def shopping_plain(i):
+        return (await post({"items": plain_lists[i % len(plain_lists)]})).status_code == 200
+
+    async def shopping_llm(i):
+        return (await post({"items": f"{REQUESTS[i % len(REQUESTS)]} #{i % 50}"})).status_code == 200
+
+    async def shopping_compact(i):
+        body = {"items": f"{REQUESTS[i % len(REQUESTS)]} #{i % 50}", "response_format": "compact"}
+        return (await post(body)).status_code == 200
+
+    async def shopping_stream(i):
+        response = await post({"items": f"{REQUESTS[i % len(REQUESTS)]} #{i % 50}"},
+                              headers={"Accept": "application/x-ndjson"})
+        async for _ in response.streaming_content:
+            pass
+        return response.status_code == 200
+
+    async def recipe(i):
+        body = {"mode": "recipe", "recipe_name": RECIPES[i % len(RECIPES)], "servings": 2 + i % 6}
+        return (await post(body)).status_code == 200
+
+    async def recipe_ingredients(i):
+        body = {"recipe_name": RECIPES[i % len(RECIPES)], "servings": 2 + i % 6}
+        response = await client.post("/get-recipe-ingredients/", json.dumps(body), content_type="application/json")
+        return response.status_code == 200
+
+    async def ocr(i):
+        upload = io.BytesIO(image)
+        upload.name = "list.jpg"
+        response = await client.post("/process/", {"mode": "shopping", "image": upload})
+        return response.status_code == 200
+
+    scenarios = {
+        "index.shopping_plain": shopping_plain,
+        "index.shopping_llm": shopping_llm,
+        "index.shopping_compact": shopping_compact,
+        "index.shopping_stream": shopping_stream,
+        "index.recipe": recipe,
+        "get_recipe_ingredients": recipe_ingredients,
+    }
+    if image is not None:
+        scenarios["index.ocr"] = ocr
+    return scenarios
+
+
+def function_scenarios(args, product_index, sample_body):
+    """Synchronous scenarios over the library functions themselves."""
+    from django.http import JsonResponse
+    from api.responses import FastJsonResponse
+    from api.views import get_product_recommendations, parse_recipe_ingredients
+
+    rng = random.Random(args.seed)
+    terms = [term for terms in CATEGORIES.values() for term in terms]
+    queries = [f"{rng.choice(VARIANTS).lower()} {rng.choice(terms)}" for _ in range(512)]
+    recipe_text = ", ".join(", ".join(FakeChain("recipe").completion({"recipe_name": name})) for name in RECIPES)
+
+    return {
+        "get_product_recommendations": lambda i: get_product_recommendations(queries[i % len(queries)], product_index),
+        "parse_recipe_ingredients": lambda i: parse_recipe_ingredients(recipe_text),
+        "serialize.fast_json": lambda i: FastJsonResponse(sample_body).content,
+        "serialize.django_json": lambda i: JsonResponse(sample_body).content,
+    }
+
+
+def selected(name, patterns):
+    return not patterns or any(name.startswith(pattern) for pattern in patterns)
+
+
+async def benchmark_catalog(args, registry, size, results):
+    from django.test import AsyncClient
+    from api.product_index import swap_product_index
+
+    started = time.perf_counter()
+    product_index, products = build_index(size, registry.get("encoder").encode, args.seed)
+    print(f"\nCatalog of {size} products built in {time.perf_counter() - started:.1f}s")
+    if args.export_catalog:
+        with open(args.export_catalog, "w", encoding="utf-8") as f:
+            for product in products:
+                f.write(json.dumps(product) + "\n")
+        print(f"Wrote catalog to {args.export_catalog}")
+    del products
+    swap_product_index(product_index)
+
+    client = AsyncClient()
+    image = None
+    if args.image_size:
+        try:
+            width, height = (int(value) for value in args.image_size.split("x"))
+            image = make_image(width, height, args.seed)
+        except ImportError:
+            print("Pillow is not installed; skipping the OCR scenario")
+
+    # Warm up lazily built state (filter columns, BM25, taxonomy centroids) and
+    # capture a realistic response body for the serialization scenarios
+    response = await client.post("/process/", json.dumps({"mode": "recipe", "recipe_name": RECIPES[0]}),
+                                 content_type="application/json")
+    if response.status_code != 200:
+        raise SystemExit(f"Warm-up request failed: {response.content.decode('utf-8')}")
+    sample_body = json.loads(response.content)
+
+    for name, call in view_scenarios(args, client, image).items():
+        if not selected(name, args.scenarios):
+            continue
+        await call(0)
+        for concurrency in args.concurrency:
+            latencies, errors, seconds = await run_async(call, args.requests, concurrency)
+            results.append(report(name, size, concurrency, latencies, errors, seconds))
+
+    for name, call in function_scenarios(args, product_index, sample_body).items():
+        if not selected(name, args.scenarios):
+            continue
+        call(0)
+        for concurrency in args.concurrency:
+            latencies, errors, seconds = run_threads(call, args.function_calls, concurrency)
+            results.append(report(name, size, concurrency, latencies, errors, seconds))
+
+
+def report(name, size, concurrency, latencies, errors, seconds):
+    result = {
+        "scenario": name,
+        "catalog_size": size,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        **percentiles(latencies),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else None,
+    }
+    print(f"  {name:<28} c={concurrency:<4} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+          f"p99 {result['p99_ms']:>9.2f} ms  {result['throughput_rps']:>9.1f} req/s"
+          + (f"  {errors} errors" if errors else ""), flush=True)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """Print p50/p95 and throughput changes against an earlier results file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["catalog_size"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nChange against {baseline_path} (negative latency change is faster):")
+    for result in results:
+        before = baseline.get((result["scenario"], result["catalog_size"], result["concurrency"]))
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "throughput_rps"):
+            if before.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {100 * (result[key] - before[key]) / before[key]:+6.1f}%")
+        print(f"  {result['scenario']:<28} n={result['catalog_size']:<8} c={result['concurrency']:<4} " + "  ".join(changes))
+
+
+def int_list(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the curation pipeline offline.")
+    parser.add_argument("--catalog-sizes", type=int_list, default=[10000], help="comma-separated, e.g. 1000,100000,1000000")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per view scenario and level")
+    parser.add_argument("--function-calls", type=int, default=1000, help="calls per function scenario and level")
+    parser.add_argument("--scenarios", nargs="*", default=[], help="only run scenarios starting with these names")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to the first streamed record")
+    parser.add_argument("--llm-record-latency", type=float, default=0.02, help="seconds between streamed records")
+    parser.add_argument("--ocr-latency", type=float, default=0.5)
+    parser.add_argument("--encoder", choices=["hashing", "real"], default="hashing",
+                        help="hashing (offline fake) or the configured model (ENCODER_BACKEND)")
+    parser.add_argument("--encode-latency", type=float, default=0.0, help="seconds per text for the hashing encoder")
+    parser.add_argument("--dim", type=int, default=384, help="embedding size of the hashing encoder")
+    parser.add_argument("--image-size", default="3024x4032", help="WIDTHxHEIGHT of the OCR upload ('' to skip)")
+    parser.add_argument("--retrieval-mode", choices=["vector", "hybrid", "lexical"], default="vector")
+    parser.add_argument("--term-table", action="store_true", help="keep TERM_TABLE_PATH from the environment")
+    parser.add_argument("--export-catalog", default=None, help="also write the catalog as JSONL for load_products.py")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    registry = setup_django(args)
+    results = []
+    for size in args.catalog_sizes:
+        asyncio.run(benchmark_catalog(args, registry, size, results))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
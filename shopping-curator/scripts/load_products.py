@@ -1,16 +1,36 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv 
-import os
-import numpy as np
-from sentence_transformers import SentenceTransformer 
+"""
+Stream products into MongoDB with embeddings.
+
+    python scripts/load_products.py                       # built-in demo products
+    python scripts/load_products.py products.csv more.jsonl --workers 4
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+Rows are read lazily from CSV or JSONL files, encoded in large batches
+(optionally across a process pool) and written with unordered bulk
+upserts keyed by a stable product_id, so re-running the loader updates
+products instead of duplicating them. Rows whose description is unchanged
+keep their stored embedding, and rows that are entirely unchanged are not
+written at all.
+
+Documents left by the old loader (no product_id) are given the id their
+name and brand map to, and extra copies of the same product are deleted,
+so they are updated in place rather than duplicated in the catalog.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
 
 load_dotenv()
-# Connect to MongoDB
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["shopping"]
-collection = db["products"]
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+METADATA_FIELDS = ["name", "brand", "price", "category", "link"]
 
 # Dummy data
 products = [
@@ -115,12 +135,194 @@ products.extend([
 ])
 
 
+def read_rows(paths):
+    """Yield product dicts from CSV and JSONL files without loading them whole."""
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith((".jsonl", ".ndjson")):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(f)
+
+
+def clean_row(row):
+    product = {field: str(row.get(field) or "").strip() for field in METADATA_FIELDS}
+    if not product["link"]:
+        del product["link"]
+    product_id = row.get("product_id") or row.get("sku") or row.get("id")
+    if not product_id:
+        # Stable id for sources without one: the same name and brand always map to the same product
+        product_id = hashlib.sha1(f"{product['name']}|{product['brand']}".lower().encode("utf-8")).hexdigest()
+    product["product_id"] = str(product_id)
+    return product
+
+
+def description_of(product):
+    return f"{product['name']} {product['brand']} {product['category']}"
+
+
+def content_hash(product):
+    return hashlib.sha1(f"{MODEL_NAME}|{description_of(product)}".encode("utf-8")).hexdigest()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+_model = None
+
+
+def encode(descriptions, batch_size=256):
+    """Encode descriptions; also the entry point for process-pool workers."""
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(MODEL_NAME)
+    return _model.encode(descriptions, batch_size=batch_size, convert_to_numpy=True).tolist()
+
+
+def plan_batch(collection, batch):
+    """Split a batch into rows needing an embedding and metadata-only updates."""
+    # Repeated ids within a batch would race as concurrent upserts; last row wins
+    batch = list({product["product_id"]: product for product in batch}.values())
+    existing = {
+        doc["product_id"]: doc
+        for doc in collection.find(
+            {"product_id": {"$in": [product["product_id"] for product in batch]}},
+            {"_id": 0, "product_id": 1, "content_hash": 1, **{field: 1 for field in METADATA_FIELDS}},
+        )
+    }
+
+    to_encode, metadata_only, unchanged = [], [], 0
+    for product in batch:
+        product["content_hash"] = content_hash(product)
+        current = existing.get(product["product_id"])
+        if current is None or current.get("content_hash") != product["content_hash"]:
+            to_encode.append(product)
+        elif any(current.get(field) != product.get(field) for field in METADATA_FIELDS):
+            metadata_only.append(product)
+        else:
+            unchanged += 1
+    return to_encode, metadata_only, unchanged
+
+
+def write_batch(collection, products, embeddings=None):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    operations = []
+    for i, product in enumerate(products):
+        fields = dict(product, updated_at=now)
+        if embeddings is not None:
+            fields["embedding"] = embeddings[i]
+        operations.append(UpdateOne({"product_id": product["product_id"]}, {"$set": fields}, upsert=True))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def migrate_legacy(collection):
+    """Give documents without a product_id the id clean_row derives for them.
+
+    The old loader inserted every run again, so a product may have several
+    legacy copies; the first one is kept and the rest deleted. Returns the
+    number of (migrated, deleted) documents.
+    """
+    migrated, duplicates = 0, []
+    for doc in collection.find({"product_id": {"$exists": False}}, {field: 1 for field in METADATA_FIELDS}):
+        product_id = clean_row(doc)["product_id"]
+        if collection.count_documents({"product_id": product_id}, limit=1):
+            duplicates.append(doc["_id"])
+        else:
+            collection.update_one({"_id": doc["_id"]}, {"$set": {"product_id": product_id}})
+            migrated += 1
+    deleted = collection.delete_many({"_id": {"$in": duplicates}}).deleted_count if duplicates else 0
+    return migrated, deleted
+
+
+def ensure_indexes(collection):
+    # Partial, so documents without a product_id can never make the build fail
+    unique = {"product_id": {"$exists": True}}
+    existing = collection.index_information().get("product_id_1")
+    if existing and existing.get("partialFilterExpression") != unique:
+        collection.drop_index("product_id_1")
+    collection.create_index("product_id", unique=True, partialFilterExpression=unique)
+    collection.create_index("updated_at")
+
+
+def load(collection, rows, batch_size=1000, encode_batch_size=256, workers=0):
+    ensure_indexes(collection)
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    pending = []
+    stats = {"rows": 0, "encoded": 0, "metadata_only": 0, "unchanged": 0}
+    started = time.perf_counter()
+
+    def drain(limit):
+        # Keep at most `limit` encode jobs in flight so memory stays bounded
+        while len(pending) > limit:
+            products, future = pending.pop(0)
+            write_batch(collection, products, future.result())
+
+    try:
+        for batch in batched((clean_row(row) for row in rows), batch_size):
+            to_encode, metadata_only, unchanged = plan_batch(collection, batch)
+            write_batch(collection, metadata_only)
+
+            descriptions = [description_of(product) for product in to_encode]
+            if to_encode and executor is not None:
+                pending.append((to_encode, executor.submit(encode, descriptions, encode_batch_size)))
+                drain(workers * 2)
+            elif to_encode:
+                write_batch(collection, to_encode, encode(descriptions, encode_batch_size))
+
+            stats["rows"] += len(batch)
+            stats["encoded"] += len(to_encode)
+            stats["metadata_only"] += len(metadata_only)
+            stats["unchanged"] += unchanged
+            elapsed = time.perf_counter() - started
+            print(f"{stats['rows']} rows ({stats['rows'] / elapsed:.0f} rows/s), "
+                  f"{stats['encoded']} encoded, {stats['unchanged']} unchanged", flush=True)
+        drain(0)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load products with embeddings into MongoDB.")
+    parser.add_argument("files", nargs="*", help="CSV or JSONL files; the demo products are loaded if omitted")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk write")
+    parser.add_argument("--encode-batch-size", type=int, default=256, help="Sentences per encoder forward pass")
+    parser.add_argument("--workers", type=int, default=0, help="Encoder processes (0 encodes in this process)")
+    parser.add_argument("--remove-legacy", action="store_true",
+                        help="Delete documents inserted by the old loader (no product_id) instead of migrating them")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI"))
+    collection = client["shopping"]["products"]
+
+    if args.remove_legacy:
+        removed = collection.delete_many({"product_id": {"$exists": False}}).deleted_count
+        print(f"Removed {removed} legacy documents")
+    else:
+        migrated, deleted = migrate_legacy(collection)
+        if migrated or deleted:
+            print(f"Migrated {migrated} legacy documents, deleted {deleted} duplicate copies")
+
+    rows = read_rows(args.files) if args.files else products
+    stats = load(collection, rows, args.batch_size, args.encode_batch_size, args.workers)
+    print(f"Done: {stats['rows']} rows in {stats['seconds']:.1f}s "
+          f"({stats['rows'] / max(stats['seconds'], 1e-9):.0f} rows/s); "
+          f"{stats['encoded']} encoded, {stats['metadata_only']} metadata-only, {stats['unchanged']} unchanged")
 
-# Insert into MongoDB
-for product in products:
-    description = f"{product['name']} {product['brand']} {product['category']}"
-    embedding = model.encode(description).tolist()
-    product["embedding"] = embedding
-    collection.insert_one(product)
 
-print("Products with embeddings inserted.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Mistral OCR API, for testing uploads without a key.
+
+    python scripts/ocr_stub_server.py --port 8765 --latency 0.8
+    MISTRAL_SERVER_URL=http://127.0.0.1:8765 MISTRAL_API_KEY=stub python manage.py runserver
+
+Answers POST /v1/ocr with a response in the Mistral OCR schema whose
+markdown is --text (a grocery list by default). Each request's MIME type
+and payload size are printed, so downscaling can be checked here.
+"""
+import argparse
+import base64
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = "- milk\n- eggs\n- sourdough bread\n- bananas"
+
+
+def make_handler(text, latency):
+    class OCRStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        requests_served = 0
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/ocr":
+                self.send_json(404, {"detail": "Not Found"})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            document = body.get("document", {})
+            url = document.get("image_url") or document.get("document_url") or ""
+            if isinstance(url, dict):
+                url = url.get("url", "")
+            header, _, payload = url.partition(",")
+            size = len(base64.b64decode(payload)) if payload else 0
+            mime = header[len("data:"):].split(";")[0] if header.startswith("data:") else "url"
+
+            time.sleep(latency)
+            OCRStubHandler.requests_served += 1
+            print(f"OCR stub: request {OCRStubHandler.requests_served}, {mime}, {size} bytes")
+            self.send_json(200, {
+                "pages": [{
+                    "index": 0,
+                    "markdown": text,
+                    "images": [],
+                    "dimensions": {"dpi": 200, "height": 0, "width": 0}
+                }],
+                "model": body.get("model", "mistral-ocr-latest"),
+                "usage_info": {"pages_processed": 1, "doc_size_bytes": size}
+            })
+
+        def send_json(self, status, data):
+            content = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return OCRStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub Mistral OCR endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="markdown returned for every page")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.text.replace("\\n", "\n"), args.latency))
+    print(f"OCR stub listening on http://{args.host}:{args.port}/v1/ocr")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()